@@ -27,6 +27,9 @@ DATA_DIR = "/data"
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Files computed from DATA_DIR by the import commands (e.g. detected encodings)
+CACHE_DIR = BASE_DIR / "cache"
 LOGIN_REDIRECT_URL = '/'
 
 # Quick-start development settings - unsuitable for production
@@ -60,7 +63,11 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'django.contrib.postgres',
+    'django.contrib.gis',
     'django_select2',
+    'rest_framework',
+    'drf_spectacular',
     #'django.contrib.staticfiles',
 ]
 
@@ -95,6 +102,25 @@ if ENV == 'DEV':
         'debug_toolbar.middleware.DebugToolbarMiddleware',
     ]
 
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+}
+
+if ENV == 'DEV':
+    # The browsable API needs the static files, only served in DEV
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += [
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+
+SPECTACULAR_SETTINGS = {
+    'TITLE': 'IQS API',
+    'DESCRIPTION': 'Read-only catalogue of the geolayers, their attributes and values',
+    'VERSION': '1.0.0',
+}
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -132,6 +158,36 @@ DATABASES = {
     }
 }
 
+# Connections are taken from a psycopg pool, kept by each server process,
+# instead of being opened for every request. POSTGRES_POOL_MAX_SIZE=0 disables it.
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+if POSTGRES_POOL_MAX_SIZE:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2")),
+            'max_size': POSTGRES_POOL_MAX_SIZE,
+            'timeout': int(os.getenv("POSTGRES_POOL_TIMEOUT", "10")),
+        },
+    }
+
+# Cache of the catalogue pages, versioned by the import generation (see
+# iqs/caching.py): "locmem" (per process), "file" or "redis" (shared)
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        # Directory of the file cache, or URL of the Redis server
+        'LOCATION': os.getenv("CACHE_LOCATION") or (str(CACHE_DIR / "pages") if CACHE_BACKEND == "file" else ""),
+        'TIMEOUT': int(os.getenv("CACHE_TIMEOUT", "86400")),
+        'KEY_PREFIX': 'iqs',
+    }
+}
+
 
 
 # Password validation
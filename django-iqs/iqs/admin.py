@@ -1,10 +1,25 @@
+import re
+
 from django.contrib import admin
 
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.admin import GroupAdmin as BaseGroupAdmin
 from django.contrib.auth.models import User, Group
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .models import GeoLayer, Attribute, AttributeStatistics, AttributeType, AttributeValue, GeometryType, OgcRelationType, AttributePriorityLevel, ImportCheckpoint, ImportRun, LayerRelation, MetadataMismatch, SourceFile, ValueText
+from .pagination import EstimatedCountPaginator
+
+
+class CappedInlineFormSet(BaseInlineFormSet):
+    """Inline formset only showing the first `max_num` related objects"""
 
-from .models import GeoLayer, Attribute, AttributeType, AttributeValue, GeometryType, OgcRelationType, AttributePriorityLevel
+    def get_queryset(self):
+        if not hasattr(self, "_capped_queryset"):
+            self._capped_queryset = super().get_queryset()[:self.max_num]
+        return self._capped_queryset
 
 
 class AttributeInline(admin.TabularInline):
@@ -14,8 +29,21 @@ class AttributeInline(admin.TabularInline):
 
 class AttributeValueInline(admin.TabularInline):
     model = AttributeValue
+    formset = CappedInlineFormSet
     show_change_link = True
     extra = 3
+    # Attributes may have many thousands of values: only the first ones are
+    # shown, the others are listed in the AttributeValue changelist
+    max_num = 50
+    raw_id_fields = ["content"]
+
+
+class AttributeStatisticsInline(admin.StackedInline):
+    model = AttributeStatistics
+    # Computed at import, not edited by hand
+    readonly_fields = [f.name for f in AttributeStatistics._meta.fields if f.name not in ('id', 'attribute')]
+    can_delete = False
+    max_num = 0
 
 
 class AttributePriorityLevelAdmin(admin.ModelAdmin):
@@ -24,14 +52,31 @@ class AttributePriorityLevelAdmin(admin.ModelAdmin):
 
 
 class AttributeAdmin(admin.ModelAdmin):
-    fields = [f.name for f in Attribute._meta.fields if f.name != 'id']
-    list_filter = list_display = search_fields = fields
-    inlines = [AttributeValueInline]
+    fields = [f.name for f in Attribute._meta.fields if f.name != 'id'] + ['all_values']
+    readonly_fields = ['all_values']
+    list_display = ['name', 'geolayer', 'type']
+    list_filter = ['type']
+    list_select_related = ['geolayer', 'type']
+    search_fields = ['name', 'geolayer__name']
+    autocomplete_fields = ['geolayer']
+    inlines = [AttributeStatisticsInline, AttributeValueInline]
+
+    @admin.display(description="Values")
+    def all_values(self, obj):
+        if obj.pk is None:
+            return "-"
+        url = reverse("admin:iqs_attributevalue_changelist")
+        return format_html('<a href="{}?attribute__id__exact={}">All values of this attribute</a>', url, obj.pk)
 
 
 class GeoLayerAdmin(admin.ModelAdmin):
     fields = [f.name for f in GeoLayer._meta.fields if f.name != 'id']
-    list_filter = list_display = search_fields = fields
+    list_display = ['name', 'geom', 'epsg_code', 'source']
+    list_filter = ['geom', 'staging']
+    list_select_related = ['geom', 'source']
+    search_fields = ['name']
+    raw_id_fields = ['source']
+    readonly_fields = ['extent']
     inlines = [AttributeInline]
 
 class AttributeTypeAdmin(admin.ModelAdmin):
@@ -39,10 +84,48 @@ class AttributeTypeAdmin(admin.ModelAdmin):
     list_filter = list_display = search_fields = fields
 
 
+class ValueTextAdmin(admin.ModelAdmin):
+    fields = ['text']
+    list_display = ['text', 'hash']
+    search_fields = ['text']
+    # The texts are shared by the values of all the attributes
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the trigram index on text, as for the values
+        if not search_term:
+            return queryset, False
+        return queryset.filter(text__iregex=re.escape(search_term)), False
+
+    def get_readonly_fields(self, request, obj=None):
+        # Changing a text would change the values of every attribute having it
+        return ['text'] if obj else []
+
+    def save_model(self, request, obj, form, change):
+        obj.hash = ValueText.hash_text(obj.text)
+        super().save_model(request, obj, form, change)
+
+
 class AttributeValueAdmin(admin.ModelAdmin):
-    fields = [f.name for f in AttributeValue._meta.fields if f.name != 'id']
-    list_filter = list_display = search_fields = fields
+    fields = [f.name for f in AttributeValue._meta.fields if f.name not in ('id', 'sort_key')]
+    list_display = ['content', 'attribute', 'geolayer', 'priority_level']
+    list_filter = ['priority_level']
+    list_select_related = ['content', 'attribute__geolayer', 'priority_level']
+    search_fields = ['content__text']
+    autocomplete_fields = ['attribute']
+    raw_id_fields = ['content']
     show_change_link = True
+    # No exact COUNT(*) over the whole table on each page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # A case-insensitive regex is served by the trigram index on the
+        # texts, unlike the UPPER() LIKE of the default search
+        if not search_term:
+            return queryset, False
+        return queryset.filter(content__text__iregex=re.escape(search_term)), False
 
 class GeometryTypeAdmin(admin.ModelAdmin):
     fields = [f.name for f in GeometryType._meta.fields if f.name != 'id']
@@ -54,12 +137,53 @@ class OgcRelationTypeAdmin(admin.ModelAdmin):
     list_filter = list_display = search_fields = fields
 
 
+class SourceFileAdmin(admin.ModelAdmin):
+    fields = [f.name for f in SourceFile._meta.fields if f.name != 'id']
+    readonly_fields = ['imported_at']
+    list_display = fields
+    search_fields = ['path']
+
+
+class LayerRelationAdmin(admin.ModelAdmin):
+    list_display = ['geolayer', 'relation', 'other']
+    list_filter = ['relation']
+    list_select_related = ['geolayer', 'relation', 'other']
+    search_fields = ['geolayer__name', 'other__name']
+    raw_id_fields = ['geolayer', 'other']
+
+
+class MetadataMismatchAdmin(admin.ModelAdmin):
+    fields = [f.name for f in MetadataMismatch._meta.fields if f.name != 'id']
+    list_display = fields
+    list_filter = ['kind']
+    search_fields = ['filename', 'path']
+
+
+class ImportRunAdmin(admin.ModelAdmin):
+    fields = [f.name for f in ImportRun._meta.fields if f.name != 'id']
+    list_display = fields
+    list_filter = ['command']
+
+
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    fields = [f.name for f in ImportCheckpoint._meta.fields if f.name != 'id']
+    list_display = ['path', 'layer', 'attribute', 'offset', 'updated_at']
+    search_fields = ['path', 'layer']
+    # Written by load_data, to resume an interrupted run
+    readonly_fields = fields
+
+
 # Register the admin models classes
 admin.site.register(Attribute, AttributeAdmin)
 admin.site.register(GeoLayer, GeoLayerAdmin)
 admin.site.register(AttributeType, AttributeTypeAdmin)
 admin.site.register(AttributeValue, AttributeValueAdmin)
+admin.site.register(ValueText, ValueTextAdmin)
 admin.site.register(GeometryType, GeometryTypeAdmin)
 admin.site.register(OgcRelationType, OgcRelationTypeAdmin)
 admin.site.register(AttributePriorityLevel, AttributePriorityLevelAdmin)
-
+admin.site.register(SourceFile, SourceFileAdmin)
+admin.site.register(ImportRun, ImportRunAdmin)
+admin.site.register(ImportCheckpoint, ImportCheckpointAdmin)
+admin.site.register(LayerRelation, LayerRelationAdmin)
+admin.site.register(MetadataMismatch, MetadataMismatchAdmin)
@@ -0,0 +1,129 @@
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Attribute, GeoLayer, ImportRun, LayerRelation
+from .pagination import IdCursorPagination, attribute_values_listing
+from .search import search_catalogue
+from .spatial import filter_bbox
+from .serializers import (
+    AttributeSerializer,
+    AttributeValueSerializer,
+    GeoLayerSerializer,
+    LayerRelationSerializer,
+    SearchAttributeSerializer,
+    SearchGeoLayerSerializer,
+    SearchValueSerializer,
+)
+
+
+def last_import(request, *args, **kwargs):
+    """Return the last import run, fetched once per request"""
+    if not hasattr(request, "_last_import"):
+        request._last_import = ImportRun.last()
+    return request._last_import
+
+
+def import_etag(request, *args, **kwargs):
+    # No validator while an import runs, as the catalogue may still change
+    run = last_import(request)
+    return f"import-{run.pk}" if run and not run.running else None
+
+
+def import_last_modified(request, *args, **kwargs):
+    run = last_import(request)
+    return run.finished_at if run else None
+
+
+# The catalogue only changes with imports: clients revalidate their copy and
+# get a 304 response until the next import
+conditional_on_import = method_decorator(
+    [
+        condition(etag_func=import_etag, last_modified_func=import_last_modified),
+        cache_control(max_age=0, must_revalidate=True),
+    ],
+    name="dispatch",
+)
+
+
+@conditional_on_import
+class GeoLayerViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = GeoLayer.live.select_related("geom")
+    serializer_class = GeoLayerSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        bbox = self.request.query_params.get("bbox")
+        if bbox:
+            try:
+                queryset = filter_bbox(queryset, bbox)
+            except ValueError as err:
+                raise ValidationError({"bbox": [str(err)]})
+        return queryset
+
+    @action(detail=True, serializer_class=LayerRelationSerializer, pagination_class=None)
+    def related(self, request, pk=None):
+        """Layers whose extent intersects the extent of the layer, with the relation"""
+        # Not found for an unknown layer or a staging copy
+        geolayer = self.get_object()
+        relations = (
+            LayerRelation.objects.filter(geolayer=geolayer)
+            .select_related("other", "relation")
+            .order_by("relation__name", "other__name")
+        )
+        return Response(LayerRelationSerializer(relations, many=True).data)
+
+
+@conditional_on_import
+class AttributeViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Attribute.objects.filter(geolayer__staging=False).select_related("geolayer", "type")
+    serializer_class = AttributeSerializer
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        geolayer = self.request.query_params.get("geolayer")
+        if geolayer:
+            queryset = queryset.filter(geolayer=geolayer)
+        return queryset
+
+    @action(detail=True, serializer_class=AttributeValueSerializer)
+    def values(self, request, pk=None):
+        """
+        Values of the attribute in bytewise order, paged by the last value seen (?after=).
+        Numeric, date and boolean values can be listed in their order (?order=value)
+        and filtered by range (?min=, ?max=).
+        """
+        attribute = self.get_object()
+        try:
+            values, next_after = attribute_values_listing(attribute, request.query_params)
+        except ValueError as err:
+            raise ValidationError({"detail": str(err)})
+        next_url = None
+        if next_after is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), "after", next_after)
+        return Response({
+            "next": next_url,
+            "previous": None,
+            "results": AttributeValueSerializer(values, many=True).data,
+        })
+
+
+@conditional_on_import
+class SearchView(APIView):
+    """Geolayers, attributes and values similar to or containing ?q=, best matches first"""
+
+    def get(self, request):
+        hits = search_catalogue(request.query_params.get("q", ""))
+        return Response({
+            "geolayers": SearchGeoLayerSerializer(hits["geolayers"], many=True).data,
+            "attributes": SearchAttributeSerializer(hits["attributes"], many=True).data,
+            "values": SearchValueSerializer(hits["values"], many=True).data,
+        })
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+
+from .models import ImportRun
+
+# Returned by the cache on a miss, as None could be a cached value
+MISSING = object()
+
+
+def _generation(last_run):
+    if last_run is None:
+        return 0
+    pk, running = last_run
+    return None if running else pk
+
+
+def import_generation():
+    """
+    Return the import generation, the primary key of the last import run,
+    or None while any run is unfinished.
+
+    Import commands commit their changes in several transactions, between
+    the start of their run and its end: the generation changes once they
+    are all committed. Cached entries are versioned by it: the entries of
+    an older generation are never read again, and expire. Nothing is cached
+    while an import runs, even if a run of another command finished since,
+    nor after it failed until the next run of its command finishes.
+    """
+    return _generation(ImportRun.latest().values_list("pk", "running").first())
+
+
+async def aimport_generation():
+    return _generation(await ImportRun.latest().values_list("pk", "running").afirst())
+
+
+def fragment_timeout(generation):
+    """Timeout of the template fragments cached for an import generation: 0 is not cached"""
+    return cache.default_timeout if generation is not None else 0
+
+
+async def acached(key, generation, compute):
+    """Return the value cached under `key` for an import generation, awaiting `compute()` on a miss"""
+    if generation is None:
+        return await compute()
+    value = await cache.aget(key, MISSING, version=generation)
+    if value is MISSING:
+        value = await compute()
+        await cache.aset(key, value, version=generation)
+    return value
@@ -0,0 +1,256 @@
+import codecs
+import json
+import logging
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+import chardet
+
+from iqs.fingerprints import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Code pages of the DBF "language driver ID" byte (offset 29 of the header)
+DBF_LANGUAGE_DRIVERS = {
+    0x01: "cp437",
+    0x02: "cp850",
+    0x03: "cp1252",
+    0x57: "cp1252",
+    0x58: "cp1252",
+    0x59: "cp1252",
+    0x64: "cp852",
+    0x65: "cp865",
+    0x66: "cp866",
+    0x7D: "cp1255",
+    0x7E: "cp1256",
+    0xC8: "cp1250",
+    0xC9: "cp1251",
+    0xCB: "cp1253",
+}
+
+
+def normalize_encoding(name):
+    """
+    Return the Python codec name of an encoding label, as found in .cpg files
+    (e.g. 'UTF-8', '1252', 'ANSI 1252', 'ISO 88591'), or None if unknown.
+    """
+    label = name.strip().upper().removeprefix("ANSI").strip()
+    match = re.fullmatch(r"(?:ISO)?[ _-]?8859[ _-]?(\d+)", label)
+    if match:
+        label = f"iso8859-{match.group(1)}"
+    elif label.isdigit():
+        label = f"cp{label}"
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return None
+
+
+def read_cpg(filepath):
+    """Return the encoding declared in the .cpg sidecar of a shapefile, if any"""
+    cpg_filepath = Path(filepath).with_suffix(".cpg")
+    if not cpg_filepath.is_file():
+        return None
+    return normalize_encoding(cpg_filepath.read_text(encoding="ascii", errors="ignore"))
+
+
+# Encodings tried in turn when the records of a DBF do not decode with the
+# detected one: ISO 8859-1 decodes any byte, so one of them always does
+FALLBACK_ENCODINGS = ("utf-8", "cp1252", "iso8859-1")
+
+
+class DbfHeader(NamedTuple):
+    language_driver: int
+    records: int
+    header_length: int
+    record_length: int
+    # (offset, length) in a record of each character field
+    text_fields: list
+
+
+def read_dbf_header(f):
+    """Read the header and the field descriptors of an open DBF file"""
+    header = f.read(32)
+    header_length = int.from_bytes(header[8:10], "little")
+    text_fields = []
+    # Past the deletion flag of the record
+    offset = 1
+    while f.tell() + 32 <= header_length:
+        descriptor = f.read(32)
+        if descriptor[0] == 0x0D:
+            break
+        if descriptor[11:12] == b"C":
+            text_fields.append((offset, descriptor[16]))
+        offset += descriptor[16]
+    return DbfHeader(
+        language_driver=header[29] if len(header) > 29 else 0,
+        records=int.from_bytes(header[4:8], "little"),
+        header_length=header_length,
+        record_length=int.from_bytes(header[10:12], "little"),
+        text_fields=text_fields,
+    )
+
+
+def read_dbf_records(f, header, chunk_bytes=1 << 20):
+    """Yield the records of an open DBF file as chunks of whole records"""
+    f.seek(header.header_length)
+    per_chunk = max(chunk_bytes // max(header.record_length, 1), 1)
+    remaining = header.records
+    while remaining > 0 and (chunk := f.read(min(per_chunk, remaining) * header.record_length)):
+        remaining -= per_chunk
+        yield chunk
+
+
+def decodes(header, chunk, encoding):
+    """
+    Return whether the text fields of a chunk of DBF records decode with
+    `encoding`.
+
+    Fields are fixed-width, so a writer may have cut a multi-byte character
+    at the end of a field: the last character of a field may be incomplete.
+    """
+    try:
+        chunk.decode(encoding)
+        return True
+    except UnicodeDecodeError:
+        pass
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for start in range(0, len(chunk) - header.record_length + 1, header.record_length):
+        if chunk[start:start + 1] == b"*":
+            # Deleted records are not read
+            continue
+        for offset, length in header.text_fields:
+            value = chunk[start + offset:start + offset + length].rstrip(b" \x00")
+            if value.isascii():
+                continue
+            decoder.reset()
+            try:
+                # Not final: an incomplete last character is not an error
+                decoder.decode(value)
+            except UnicodeDecodeError:
+                return False
+    return True
+
+
+def probe_dbf(dbf_filepath, sample_bytes=1 << 20):
+    """
+    Guess the encoding of a DBF file from its records.
+
+    The records are read until `sample_bytes` bytes from the first non-ASCII
+    one have been checked: if their text fields decode as UTF-8, the file is
+    taken as such. ASCII alone proves nothing, so otherwise the language
+    driver ID of the header is used, then chardet on the non-ASCII records.
+    """
+    sample = b""
+    utf8 = True
+    with open(dbf_filepath, "rb") as f:
+        header = read_dbf_header(f)
+        for chunk in read_dbf_records(f, header):
+            if not sample and chunk.isascii():
+                continue
+            sample += chunk
+            if not decodes(header, chunk, "utf-8"):
+                utf8 = False
+                break
+            if len(sample) >= sample_bytes:
+                break
+
+    if sample and utf8:
+        return "utf-8"
+    if header.language_driver in DBF_LANGUAGE_DRIVERS:
+        return DBF_LANGUAGE_DRIVERS[header.language_driver]
+    if not sample:
+        # Any ASCII-compatible encoding reads the records
+        return "utf-8"
+
+    detected = chardet.detect(sample[:sample_bytes])
+    encoding = detected["encoding"] and normalize_encoding(detected["encoding"])
+    if encoding and encoding != "ascii" and detected["confidence"] > 0.8:
+        return encoding
+    return "cp1252"
+
+
+def check_encoding(dbf_filepath, encoding):
+    """
+    Return the first of `encoding` and the fallback encodings which decodes
+    the text fields of every record of a DBF file, as a reader would
+    otherwise read the values which do not decode as nulls.
+    """
+    candidates = [encoding] if encoding else []
+    candidates += [candidate for candidate in FALLBACK_ENCODINGS if candidate != encoding]
+    with open(dbf_filepath, "rb") as f:
+        header = read_dbf_header(f)
+        for candidate in candidates:
+            if all(decodes(header, chunk, candidate) for chunk in read_dbf_records(f, header)):
+                return candidate
+            logger.warning("The records of %s do not decode as %s", dbf_filepath.name, candidate)
+    raise UnicodeError(f"The records of {dbf_filepath.name} do not decode with {', '.join(candidates)}")
+
+
+def detect_encoding(filepath):
+    """
+    Return the encoding of the attributes of a data file: the one declared
+    by the .cpg sidecar of a shapefile or else probed, once checked against
+    every record of its DBF.
+    """
+    filepath = Path(filepath)
+    if filepath.suffix.lower() != ".shp":
+        # GeoPackages are SQLite databases, which store text as UTF-8
+        return "utf-8"
+
+    declared = read_cpg(filepath)
+    dbf_filepath = filepath.with_suffix(".dbf")
+    if not dbf_filepath.is_file():
+        return declared
+    encoding = check_encoding(dbf_filepath, declared or probe_dbf(dbf_filepath))
+    if declared and encoding != declared:
+        logger.warning(
+            "%s declares %s in its .cpg, but its records do not decode as such: read as %s",
+            filepath.name, declared, encoding,
+        )
+    return encoding
+
+
+class EncodingCache:
+    """
+    Encodings of the data files, persisted as JSON and keyed by fingerprint
+    so that a file is only probed and checked again once it has changed.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+        self.changed = False
+
+    def get(self, filepath, fingerprint=None):
+        fingerprint = fingerprint or file_fingerprint(filepath)
+        entry = self.entries.get(fingerprint.path)
+        # Entries without "checked" were probed but never checked against the records
+        if (
+            entry
+            and entry.get("checked")
+            and entry["size"] == fingerprint.size
+            and entry["mtime"] == fingerprint.mtime
+        ):
+            return entry["encoding"]
+
+        encoding = detect_encoding(filepath)
+        self.entries[fingerprint.path] = {
+            "size": fingerprint.size,
+            "mtime": fingerprint.mtime,
+            "encoding": encoding,
+            "checked": True,
+        }
+        self.changed = True
+        return encoding
+
+    def save(self):
+        if not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.entries, indent=1))
+        self.changed = False
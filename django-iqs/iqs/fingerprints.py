@@ -0,0 +1,54 @@
+import hashlib
+from pathlib import Path
+from typing import NamedTuple
+
+# Files making up an ESRI Shapefile: a change in any of them changes the layer
+SHAPEFILE_SUFFIXES = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+class Fingerprint(NamedTuple):
+    """Size, modification time and optional content hash of a data file"""
+
+    path: str
+    size: int
+    mtime: float
+    checksum: str = ""
+
+
+def companion_files(filepath):
+    """Return the files a data file is made of, itself included"""
+    filepath = Path(filepath)
+    if filepath.suffix.lower() != ".shp":
+        return [filepath]
+    return [
+        path
+        for path in (filepath.with_suffix(suffix) for suffix in SHAPEFILE_SUFFIXES)
+        if path.is_file()
+    ]
+
+
+def file_fingerprint(filepath, checksum=False, chunk_size=1 << 20):
+    """
+    Compute the fingerprint of a data file and its companion files.
+
+    The content hash (SHA-256) is only computed if `checksum` is set, as it
+    requires reading the whole files.
+    """
+    size = 0
+    mtime = 0.0
+    digest = hashlib.sha256() if checksum else None
+    for path in companion_files(filepath):
+        stat = path.stat()
+        size += stat.st_size
+        mtime = max(mtime, stat.st_mtime)
+        if digest is not None:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    digest.update(chunk)
+
+    return Fingerprint(
+        path=str(filepath),
+        size=size,
+        mtime=mtime,
+        checksum=digest.hexdigest() if digest is not None else "",
+    )
@@ -0,0 +1,134 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.db import connection
+
+
+def add_instrumentation_arguments(parser):
+    """Add the options of `Instrumentation.report` to a command parser"""
+    parser.add_argument(
+        "--metrics-json",
+        help="Write the JSON summary of the run to this file",
+    )
+    parser.add_argument(
+        "--prometheus",
+        help="Write the metrics of the run to this file in the Prometheus textfile format",
+    )
+
+
+class Instrumentation:
+    """
+    Wall time, database queries and processed rows of each stage of a command.
+
+    Queries are counted by installing the instance as a database execute
+    wrapper with `capture()`; they are attributed to the innermost running
+    stage, or to 'other' outside of any stage.
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.stages = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "queries": 0, "rows": 0})
+        self.files = {}
+        self._running = []
+        self._start = time.perf_counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.stages[self._running[-1] if self._running else "other"]["queries"] += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def capture(self):
+        """Count the queries run on the default connection"""
+        with connection.execute_wrapper(self):
+            yield self
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as a run of stage `name`"""
+        self._running.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._running.pop()
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds, rows=0):
+        """Record a run of a stage, e.g. one timed in a worker process"""
+        stage = self.stages[name]
+        stage["calls"] += 1
+        stage["seconds"] += seconds
+        stage["rows"] += rows
+
+    def add_rows(self, name, rows):
+        self.stages[name]["rows"] += rows
+
+    def record_file(self, filepath, seconds):
+        self.files[str(filepath)] = self.files.get(str(filepath), 0.0) + seconds
+
+    def slowest_files(self, count):
+        return sorted(self.files, key=self.files.get, reverse=True)[:count]
+
+    def summary(self):
+        seconds = time.perf_counter() - self._start
+        return {
+            "command": self.command,
+            "seconds": round(seconds, 3),
+            "queries": sum(stage["queries"] for stage in self.stages.values()),
+            "stages": {
+                name: {
+                    **stage,
+                    "seconds": round(stage["seconds"], 3),
+                    "rows_per_second": round(stage["rows"] / stage["seconds"]) if stage["rows"] and stage["seconds"] else None,
+                }
+                for name, stage in self.stages.items()
+            },
+            "slowest_files": {
+                filepath: round(self.files[filepath], 3) for filepath in self.slowest_files(10)
+            },
+        }
+
+    def prometheus(self, summary):
+        """Format a summary in the Prometheus text exposition format"""
+        labels = f'command="{self.command}"'
+        lines = [
+            "# HELP iqs_import_seconds Wall time of the import command",
+            "# TYPE iqs_import_seconds gauge",
+            f"iqs_import_seconds{{{labels}}} {summary['seconds']}",
+            "# HELP iqs_import_last_run_timestamp_seconds End time of the last import",
+            "# TYPE iqs_import_last_run_timestamp_seconds gauge",
+            f"iqs_import_last_run_timestamp_seconds{{{labels}}} {time.time():.0f}",
+        ]
+        for metric, help_text in [
+            ("seconds", "Time spent per import stage"),
+            ("calls", "Number of runs per import stage"),
+            ("queries", "Database queries per import stage"),
+            ("rows", "Rows processed per import stage"),
+        ]:
+            lines += [
+                f"# HELP iqs_import_stage_{metric} {help_text}",
+                f"# TYPE iqs_import_stage_{metric} gauge",
+            ]
+            lines += [
+                f'iqs_import_stage_{metric}{{{labels},stage="{name}"}} {stage[metric]}'
+                for name, stage in summary["stages"].items()
+            ]
+        return "\n".join(lines) + "\n"
+
+    def report(self, out, metrics_json=None, prometheus=None, **kwargs):
+        """Write the summary to `out` and to the files given in the command options"""
+        summary = self.summary()
+        output = json.dumps(summary, indent=2)
+        out.write(output)
+        if metrics_json:
+            Path(metrics_json).write_text(output)
+        if prometheus:
+            # Written aside then renamed, so a textfile collector never reads a partial file
+            tmp_path = Path(f"{prometheus}.tmp")
+            tmp_path.write_text(self.prometheus(summary))
+            os.replace(tmp_path, prometheus)
+        return summary
@@ -0,0 +1,64 @@
+from collections import defaultdict
+from itertools import islice
+
+from iqs.models import Attribute, AttributeType, GeoLayer, GeometryType
+
+
+class ImportCache:
+    """
+    Lookup tables used during an import, preloaded and keyed by natural key.
+
+    Missing lookup values are inserted with a single statement, so the number
+    of queries depends on the number of distinct values and not on the number
+    of attributes. The cache must be discarded if a transaction which wrote
+    through it is rolled back.
+    """
+
+    max_value_texts = 100_000
+
+    def __init__(self):
+        self.attribute_types = {obj.name: obj for obj in AttributeType.objects.all()}
+        self.geometry_types = {obj.name: obj for obj in GeometryType.objects.all()}
+        self.geolayers = {obj.name: obj for obj in GeoLayer.live.all()}
+        # {geolayer id: {attribute name: attribute}}
+        self.attributes = defaultdict(dict)
+        for attribute in Attribute.objects.filter(geolayer__staging=False):
+            self.attributes[attribute.geolayer_id][attribute.name] = attribute
+        # {text: ValueText id}, filled as the values are written
+        self.value_texts = {}
+        # Number of values deleted: only then may texts be left unused
+        self.deleted_values = 0
+
+    @staticmethod
+    def _get_or_create_many(model, instances, names):
+        missing = [name for name in dict.fromkeys(names) if name not in instances]
+        if missing:
+            for obj in model.objects.bulk_create([model(name=name) for name in missing]):
+                instances[obj.name] = obj
+        return {name: instances[name] for name in names}
+
+    def get_attribute_types(self, names):
+        """Return a {name: AttributeType} dict, creating the missing types"""
+        return self._get_or_create_many(AttributeType, self.attribute_types, list(names))
+
+    def get_geometry_type(self, name):
+        """Return the GeometryType with the given name, creating it if missing"""
+        return self._get_or_create_many(GeometryType, self.geometry_types, [name])[name]
+
+    def get_attributes(self, geolayer):
+        """Return the {name: Attribute} dict of a geolayer"""
+        return self.attributes[geolayer.pk]
+
+    def remember_value_texts(self, ids):
+        """
+        Keep the ids of ValueText entries for the next layers, up to
+        `max_value_texts` as a layer may have millions of values
+        """
+        room = self.max_value_texts - len(self.value_texts)
+        if room > 0:
+            self.value_texts.update(islice(ids.items(), room))
+
+    def forget_geolayer(self, geolayer):
+        """Drop a deleted geolayer and its attributes from the cache"""
+        self.geolayers.pop(geolayer.name, None)
+        self.attributes.pop(geolayer.pk, None)
@@ -0,0 +1,255 @@
+import contextlib
+import datetime
+import io
+import json
+import resource
+import tempfile
+from pathlib import Path
+
+import fiona
+import geopandas as gpd
+from fiona.crs import CRS
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from iqs.instrumentation import Instrumentation
+from iqs.management.commands.load_data import get_unique_values
+from iqs.models import AttributeValue, GeoLayer, SourceFile
+
+FORMATS = {
+    "shp": ("ESRI Shapefile", ".shp"),
+    "gpkg": ("GPKG", ".gpkg"),
+}
+
+# Types given to the synthetic attributes, in turn
+ATTRIBUTE_TYPES = ["str:80", "int", "float", "date"]
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark import"""
+
+
+def synthetic_value(attr_type, index):
+    """Return the `index`-th distinct value of an attribute type"""
+    if attr_type.startswith("str"):
+        # Non-ASCII characters make the encoding matter
+        return f"Valeur n°{index} à Genève"
+    if attr_type == "int":
+        return index
+    if attr_type == "float":
+        return index / 7
+    return (datetime.date(2000, 1, 1) + datetime.timedelta(days=index)).isoformat()
+
+
+def synthetic_feature(index, attributes, cardinality, geometry):
+    x, y = 2500000 + index % 1000 * 10.0, 1100000 + index // 1000 * 10.0
+    if geometry == "Point":
+        coordinates = (x, y)
+    else:
+        coordinates = [[(x, y), (x + 5, y), (x + 5, y + 5), (x, y + 5), (x, y)]]
+    return {
+        "geometry": {"type": geometry, "coordinates": coordinates},
+        "properties": {
+            name: synthetic_value(attr_type, (index + column) % cardinality)
+            for column, (name, attr_type) in enumerate(attributes.items())
+        },
+    }
+
+
+def generate_layer(filepath, driver, encoding, features, attributes, cardinality, geometry):
+    """Write a synthetic layer of `features` features to `filepath`"""
+    attributes = {
+        f"attr_{column}": ATTRIBUTE_TYPES[column % len(ATTRIBUTE_TYPES)]
+        for column in range(attributes)
+    }
+    schema = {"geometry": geometry, "properties": attributes}
+    with fiona.open(
+        filepath,
+        "w",
+        driver=driver,
+        schema=schema,
+        crs=CRS.from_epsg(2056),
+        encoding=encoding,
+    ) as dst:
+        batch = []
+        for index in range(features):
+            batch.append(synthetic_feature(index, attributes, cardinality, geometry))
+            if len(batch) == 10000:
+                dst.writerecords(batch)
+                batch = []
+        dst.writerecords(batch)
+
+
+def legacy_unique_values(gdf):
+    """Column de-duplication and unique extraction as they were before being vectorized, as a baseline"""
+    new_cols = []
+    counts = {}
+    for i, col in enumerate(gdf.columns):
+        if not gdf.columns.duplicated()[i]:
+            counts[col] = 1
+            new_cols.append(col)
+        else:
+            counts[col] += 1
+            new_cols.append(f"{col.rstrip('_')}_{counts[col]-1}")
+    gdf = gdf.copy()
+    gdf.columns = new_cols
+    return {column: gdf[column].unique() for column in gdf.columns if column != "geometry"}
+
+
+def rss_high_water_mb():
+    """
+    Peak resident set size of this process and of its finished children
+    since they started, in MB: a running maximum, not the peak of a stage
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+class Command(BaseCommand):
+    help = """Benchmark the import pipeline on synthetic ESRI Shapefiles and
+    Geopackages, on an empty database: load_data would prune the layers of
+    any other data directory. The import is rolled back unless --keep is given."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--layers", type=int, default=4, help="Number of layers to generate")
+        parser.add_argument("--features", type=int, default=10000, help="Number of features per layer")
+        parser.add_argument("--attributes", type=int, default=10, help="Number of attributes per layer")
+        parser.add_argument("--cardinality", type=int, default=100, help="Number of distinct values per attribute")
+        parser.add_argument(
+            "--format",
+            choices=list(FORMATS),
+            nargs="+",
+            default=list(FORMATS),
+            help="Formats of the layers, used in turn",
+        )
+        parser.add_argument(
+            "--encoding",
+            nargs="+",
+            default=["utf-8", "cp1252"],
+            help="Encodings of the shapefiles, used in turn",
+        )
+        parser.add_argument("--geometry", choices=["Point", "Polygon"], default="Point")
+        parser.add_argument("--data-dir", help="Write the layers to this directory instead of a temporary one")
+        parser.add_argument("--keep", action="store_true", help="Commit the imported data")
+        parser.add_argument("--json", help="Write the report as JSON to this file")
+        parser.add_argument(
+            "--unique-values",
+            action="store_true",
+            help="Also time the unique values extraction of the geopandas reader against its legacy version",
+        )
+        # Options passed through to load_data
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--writer", choices=["copy", "bulk"], default="copy")
+        parser.add_argument("--reader", choices=["stream", "geopandas"], default="stream")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def run_stage(self, name, func, rows=None):
+        """Run `func` as a stage and record the RSS high-water mark at its end"""
+        with self.instrumentation.stage(name):
+            result = func()
+        if rows:
+            self.instrumentation.add_rows(name, rows(result))
+        self.rss_high_water[name] = round(rss_high_water_mb(), 1)
+        return result
+
+    def generate(self, directory, options):
+        filepaths = []
+        for index in range(options["layers"]):
+            driver, suffix = FORMATS[options["format"][index % len(options["format"])]]
+            encoding = options["encoding"][index % len(options["encoding"])] if suffix == ".shp" else None
+            filepath = Path(directory) / f"bench_{index}{suffix}"
+            generate_layer(
+                filepath,
+                driver,
+                encoding,
+                options["features"],
+                options["attributes"],
+                options["cardinality"],
+                options["geometry"],
+            )
+            filepaths.append(filepath)
+        return filepaths
+
+    def compare_unique_values(self, filepaths):
+        """Time the legacy and the vectorized unique values extraction on the same frames"""
+        frames = [gpd.read_file(filepath) for filepath in filepaths]
+        rows = sum(len(gdf) * (len(gdf.columns) - 1) for gdf in frames)
+        self.run_stage(
+            "unique_legacy",
+            lambda: [legacy_unique_values(gdf) for gdf in frames],
+            rows=lambda result: rows,
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.run_stage(
+                "unique_values",
+                lambda: [get_unique_values(gdf) for gdf in frames],
+                rows=lambda result: rows,
+            )
+
+    def load(self, directory, options):
+        output = io.StringIO()
+        quiet = options["verbosity"] < 2
+        metrics_path = Path(self.workdir) / "load_data.json"
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            call_command(
+                "load_data",
+                data_dir=str(directory),
+                workers=options["workers"],
+                writer=options["writer"],
+                reader=options["reader"],
+                batch_size=options["batch_size"],
+                metrics_json=str(metrics_path),
+                stdout=output if quiet else self.stdout,
+            )
+        self.load_data_stages = json.loads(metrics_path.read_text())["stages"]
+        return AttributeValue.objects.count()
+
+    def handle(self, *args, **options):
+        # load_data deletes the source files which are not in the benchmark
+        # directory, with their layers
+        if SourceFile.objects.exists() or GeoLayer.objects.exists():
+            raise CommandError(
+                "The database holds a catalogue, which the benchmark would delete: "
+                "run it against an empty database"
+            )
+        self.instrumentation = Instrumentation("bench_import")
+        self.rss_high_water = {}
+        self.load_data_stages = {}
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(self.instrumentation.capture())
+            self.workdir = stack.enter_context(tempfile.TemporaryDirectory())
+            # The manifest and the encodings of the temporary files are not
+            # kept next to those of the data directory
+            stack.enter_context(override_settings(CACHE_DIR=Path(self.workdir) / "cache"))
+            directory = options["data_dir"] or self.workdir
+            filepaths = self.run_stage(
+                "generate",
+                lambda: self.generate(directory, options),
+                rows=lambda filepaths: options["layers"] * options["features"],
+            )
+            if options["unique_values"]:
+                self.compare_unique_values(filepaths)
+            try:
+                with transaction.atomic():
+                    self.run_stage("import", lambda: self.load(directory, options), rows=lambda count: count)
+                    if not options["keep"]:
+                        raise Rollback
+            except Rollback:
+                pass
+
+        report = self.instrumentation.summary()
+        report["rss_high_water_mb"] = self.rss_high_water
+        report["load_data"] = self.load_data_stages
+        stages = [(name, stage) for name, stage in report["stages"].items() if name != "other"]
+        stages += [(f"  {name}", stage) for name, stage in self.load_data_stages.items()]
+        for name, stage in stages:
+            self.stdout.write(
+                f"{name:<18} {stage['seconds']:>10.3f}s {stage['queries']:>8} queries "
+                f"{stage['rows']:>10} rows {stage['rows_per_second'] or 0:>10} rows/s"
+                + (f" {self.rss_high_water[name]:>8.1f} MB RSS high-water" if name in self.rss_high_water else "")
+            )
+        if options["json"]:
+            Path(options["json"]).write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS("Benchmark done."))
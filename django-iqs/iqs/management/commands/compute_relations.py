@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from iqs.instrumentation import Instrumentation, add_instrumentation_arguments
+from iqs.models import GeoLayer, ImportRun, LayerRelation, OgcRelationType
+
+# Pairs of layers are only tested when their bounding boxes overlap (&&, served
+# by the GiST index of the extents), and then given the most specific relation
+RELATIONS_SQL = """
+    INSERT INTO {relation_table} (geolayer_id, other_id, relation_id)
+    SELECT pair.geolayer_id, pair.other_id, relation_type.id
+    FROM (
+        SELECT
+            a.id AS geolayer_id,
+            b.id AS other_id,
+            CASE
+                WHEN ST_Equals(a.extent, b.extent) THEN 'equals'
+                WHEN ST_Contains(a.extent, b.extent) THEN 'contains'
+                WHEN ST_Within(a.extent, b.extent) THEN 'within'
+                WHEN ST_Touches(a.extent, b.extent) THEN 'touches'
+                WHEN ST_Intersects(a.extent, b.extent) THEN 'intersects'
+            END AS name
+        FROM {geolayer_table} a
+        JOIN {geolayer_table} b ON a.extent && b.extent AND a.id <> b.id
+        WHERE (a.relations_dirty OR b.relations_dirty)
+            -- The staging copies of the layers being imported are left out
+            AND NOT a.staging AND NOT b.staging
+    ) pair
+    JOIN {relation_type_table} relation_type ON relation_type.name = pair.name
+"""
+
+
+class Command(BaseCommand):
+    help = """Compute the spatial relations between the extents of the
+    geolayers. Only the pairs involving a layer whose extent changed since
+    the last run are computed again, unless --full is given."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Compute the relations of every layer again",
+        )
+        add_instrumentation_arguments(parser)
+
+    def handle(self, *args, **kwargs):
+        instrumentation = Instrumentation("compute_relations")
+        started_at = timezone.now()
+        with instrumentation.capture(), transaction.atomic():
+            if kwargs["full"]:
+                GeoLayer.live.update(relations_dirty=True)
+
+            with instrumentation.stage("delete"):
+                deleted, _ = LayerRelation.objects.filter(
+                    Q(geolayer__relations_dirty=True) | Q(other__relations_dirty=True)
+                ).delete()
+
+            with instrumentation.stage("compute"), connection.cursor() as cursor:
+                quote = connection.ops.quote_name
+                cursor.execute(RELATIONS_SQL.format(
+                    relation_table=quote(LayerRelation._meta.db_table),
+                    geolayer_table=quote(GeoLayer._meta.db_table),
+                    relation_type_table=quote(OgcRelationType._meta.db_table),
+                ))
+                created = cursor.rowcount
+            instrumentation.add_rows("compute", created)
+
+            layers = GeoLayer.live.filter(relations_dirty=True).update(relations_dirty=False)
+            ImportRun.objects.create(command="compute_relations", started_at=started_at)
+
+        instrumentation.report(self.stdout, **kwargs)
+        self.stdout.write(self.style.SUCCESS(
+            f"Relations computed for {layers} layers: {deleted} removed, {created} created."
+        ))
@@ -1,13 +1,37 @@
+import cProfile
+import hashlib
+import heapq
+import math
+import multiprocessing
+import numbers
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
+from typing import NamedTuple
 
 import chardet
+import django
 import fiona
 import geopandas as gpd
-from pyproj import CRS
+import numpy as np
+import pandas as pd
+import pyogrio
+from pyproj import CRS, Transformer
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from iqs.models import Attribute, AttributeType, GeoLayer, GeometryType, AttributeValue
+from django.db import connection, transaction
+from iqs.charset import EncodingCache
+from iqs.fingerprints import file_fingerprint
+from iqs.instrumentation import Instrumentation, add_instrumentation_arguments
+from iqs.lookups import ImportCache
+from iqs.manifest import FileManifest, add_manifest_arguments
+from iqs.models import Attribute, AttributeStatistics, GeoLayer, AttributeValue, ImportCheckpoint, ImportRun, SourceFile, ValueText
+from iqs.spatial import extent_polygon
+from iqs.typed_values import typed_field, typed_values
 
 
 def fiona_to_postgres_type(fiona_type):
@@ -46,184 +70,1041 @@ def fiona_to_postgres_type(fiona_type):
     return mapping.get(fiona_type, "TEXT")
 
 
-# Define your Class commands here
-class Command(BaseCommand):
-    help = """Import layer and attribute data from a data directory holding
-    ESRI Shapefiles and Geopackages"""
+def chunked(iterable, size):
+    """Yield lists of at most `size` items from `iterable`"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
-    def handle(self, *args, **kwargs):
-        """Docstring"""
-        directory = settings.DATA_DIR
-        print(f"Data {directory=}")
-        extensions_to_fetch = {".shp", ".gpkg"}
-        filepaths = list(
-            p.resolve()
-            for p in Path(directory).glob("**/*")
-            if p.suffix in extensions_to_fetch
-        )
-        # Delete all objects in tables before writing data
-        GeoLayer.objects.all().delete()
-        Attribute.objects.all().delete()
-        AttributeType.objects.all().delete()
-        GeometryType.objects.all().delete()
-
-        def extract_epsg_from_crs(crs_input):
-            """
-            Given a Fiona CRS input (dict, WKT string, pyproj CRS, etc.),
-            return the EPSG code as int if found, else None.
-            """
-            if crs_input is None:
-                return None
-
-            try:
-                # Parse input into a pyproj CRS object
-                py_crs = CRS.from_user_input(crs_input)
-                epsg = py_crs.to_epsg()
-                return epsg  # will be int or None
-            except Exception:
-                return None
-
-
-        def load_metadata_with_fiona(filepath, layer=None):
-            # Open a file for reading. We'll call this the source.
-            with fiona.open(filepath, layer=layer) as src:
-                return {
-                    "layer_name": src.name,
-                    "driver": src.driver,
-                    "crs": extract_epsg_from_crs(src.crs),
-                    "attributes": src.schema["properties"],
-                    "geometry_type": src.schema["geometry"],
-                }
 
+def copy_rows(model, fields, rows):
+    """Stream rows of values of `fields` to the table of a model, in a single COPY statement"""
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
 
-        def guess_encoding(filepath, sample_bytes=100000):
-            """Detect the encoding of a file using chardet on the first `sample_bytes` bytes."""
-            try:
-                with open(filepath, "rb") as f:
-                    raw = f.read(sample_bytes)
-                detected = chardet.detect(raw)
-                encoding = detected['encoding']
-                confidence = detected['confidence']
-                print(f"Chardet guess: {encoding} (confidence: {confidence:.2f})")
-                return encoding, confidence
-            except Exception as err:
-                print(f"Error detecting encoding of {filepath.name} with chardet: {err}")
-                return None, 0.0
-
-
-        def get_layer(filepath):
-            layers = fiona.listlayers(filepath)
-            for layer in layers:
-                with fiona.open(filepath, layer=layer) as src:
-                    if src.schema["geometry"] != "None":
-                        return layer # returns the first valid layer, assuming there is only one
-            return None
-
-
-        def load_data(filepath):
-            # Open a file for reading. We'll call this the source.
-            common_encodings = ['utf-8', 'cp1252', 'ISO-8859-1']
-            layer = get_layer(filepath)
-            for encoding in common_encodings:
-                print(f"Testing {encoding=} to open file: {filepath.name}...")
-                try:
-                    gdf = gpd.read_file(
-                        filepath,
-                        layer=layer,
-                        encoding=encoding,
-                    )
-                    print(f"Successfully loaded {filepath.name} with encoding: {encoding}")
-                    return gdf
-                except UnicodeDecodeError as err:
-                      print(f"UnicodeDecodeError: failed loading {filepath.name} with encoding {encoding}: error={err}")
-
-            if filepath.suffix[1:] == 'shp':
-                dbf_filepath = filepath.with_suffix(".dbf")
-                if not dbf_filepath.is_file():
-                    print(f"{dbf_filepath} does not exist!")
-                    pass
-
-                encoding, confidence = guess_encoding(dbf_filepath)
-                if encoding and confidence > 0.8:
-                    try:
-                        gdf = gpd.read_file(
-                            filepath,
-                            layer=layer,
-                            encoding=encoding,
-                        )
-                        print(f"Successfully loaded {filepath.name} with guessed encoding: {encoding}")
-                        return gdf
-                    except UnicodeDecodeError as err:
-                        print(f"UnicodeDecodeError: failed loading {filepath.name} with guessed encoding {encoding}: error={err}")
 
-            raise UnicodeDecodeError(f"Failed to decode {filepath.name} with all tried encodings, including guessed one.")
+def get_value_text_ids(texts, cache, batch_size=5000, writer="copy"):
+    """
+    Return the {text: id} dict of the entries of the ValueText dictionary,
+    inserting the missing texts with the given writer.
 
+    Texts are looked up by hash, by chunks of `batch_size`, unless their id
+    is already in the import `cache`.
+    """
+    ids = {}
+    missing = []
+    for text in texts:
+        text_id = cache.value_texts.get(text)
+        if text_id is None:
+            missing.append(text)
+        else:
+            ids[text] = text_id
 
-        def make_columns_unique(gdf):
-            new_cols = []
-            counts = {}
+    for batch in chunked(missing, batch_size):
+        hashes = {ValueText.hash_text(text): text for text in batch}
+        found = dict(ValueText.objects.filter(hash__in=hashes).values_list("hash", "pk"))
+        new = {text_hash: text for text_hash, text in hashes.items() if text_hash not in found}
+        if new and writer == "copy":
+            copy_rows(ValueText, ("hash", "text"), new.items())
+            found.update(ValueText.objects.filter(hash__in=new).values_list("hash", "pk"))
+        elif new:
+            created = ValueText.objects.bulk_create(
+                ValueText(hash=text_hash, text=text) for text_hash, text in new.items()
+            )
+            found.update((obj.hash, obj.pk) for obj in created)
+        ids.update((text, found[text_hash]) for text_hash, text in hashes.items())
 
-            for i, col in enumerate(gdf.columns):
-                if not gdf.columns.duplicated()[i]:
-                    counts[col] = 1
-                    new_cols.append(col)
-                else: # we've got a duplicate column name
-                    counts[col] += 1
-                    new_cols.append(f"{col.rstrip('_')}_{counts[col]-1}")
+    cache.remember_value_texts(ids)
+    return ids
 
-            new_gdf = gdf.copy()
-            new_gdf.columns = new_cols
 
-            return new_gdf
+def deleted_values(deleted):
+    """
+    Return the number of attribute values in the result of a `delete()`,
+    deleted directly or along with their attribute, layer or file
+    """
+    return deleted[1].get(AttributeValue._meta.label, 0)
 
 
-        def get_unique_values(gdf):
-            # do not take the geometry column into consideration
-            gdf = make_columns_unique(gdf)
-            print("Extracting unique values for each attribute, please wait...")
-            return dict([(column, gdf[column].unique()) for column in gdf.columns if column != 'geometry'])
+def prune_value_texts():
+    """Delete the texts of the ValueText dictionary which no value has anymore, and return their number"""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(ValueText._meta.db_table)} AS value_text WHERE NOT EXISTS ("
+            f"SELECT 1 FROM {quote(AttributeValue._meta.db_table)} AS attribute_value "
+            f"WHERE attribute_value.{quote(AttributeValue._meta.get_field('content').column)} = value_text.id)"
+        )
+        return cursor.rowcount
 
 
-        def extract_unique_value(filepath):
-            gdf = load_data(filepath)
-            return get_unique_values(gdf)
+def write_attribute_values(attribute, values, cache, attr_type=None, batch_size=5000, writer="copy"):
+    """
+    Write the distinct values of an attribute and return the number of rows.
 
+    With the 'copy' writer the rows are streamed to PostgreSQL through a
+    single COPY statement; with the 'bulk' writer they are inserted by
+    chunks of `batch_size` rows with `bulk_create`. The texts are written
+    once to the ValueText dictionary, shared by all the attributes, and
+    the values of numeric, date and boolean `attr_type` are typed.
+    """
+    # Values that differ only by type (e.g. 1 and '1') collapse to the same
+    # content and would break the unique constraint
+    contents = list(dict.fromkeys(str(value) for value in values))
+    text_ids = get_value_text_ids(contents, cache, batch_size=batch_size, writer=writer)
+    field = typed_field(attr_type)
 
-        for filepath in filepaths:
-            layer_name, driver, crs, attributes, geometry_type = (
-                load_metadata_with_fiona(filepath).values()
+    sort_key = AttributeValue.text_sort_key
+    if writer == "copy" and field:
+        copy_rows(
+            AttributeValue,
+            ("attribute", "content", "sort_key", field),
+            (
+                (attribute.pk, text_ids[content], sort_key(content), typed_values(attr_type, content).get(field))
+                for content in contents
+            ),
+        )
+    elif writer == "copy":
+        copy_rows(
+            AttributeValue,
+            ("attribute", "content", "sort_key"),
+            ((attribute.pk, text_ids[content], sort_key(content)) for content in contents),
+        )
+    else:
+        objs = (
+            AttributeValue(
+                attribute=attribute,
+                content_id=text_ids[content],
+                sort_key=sort_key(content),
+                **typed_values(attr_type, content),
             )
-            print(
-                f"{80*'#'}\nScanning file \"{filepath}\":\n"
-                f"{80*'#'}\n{driver=}\n{crs=}\n{attributes=}\n{geometry_type=}"
+            for content in contents
+        )
+        for batch in chunked(objs, batch_size):
+            AttributeValue.objects.bulk_create(batch)
+
+    return len(contents)
+
+
+def sync_geolayer(source, metadata, values, cache, statistics=None, batch_size=5000, writer="copy"):
+    """
+    Create or update a geolayer with its attributes, their values and statistics.
+
+    Only the differences with what is already stored are written: attributes
+    and values which are gone from the file are deleted, new ones are
+    inserted. Lookups go through the import `cache`. Returns the number of
+    values written.
+    """
+    geometry = cache.get_geometry_type(metadata["geometry_type"])
+    fields = {
+        "epsg_code": metadata["crs"],
+        "geom": geometry,
+        "source": source,
+        "extent": extent_polygon(metadata["extent"]),
+    }
+    geolayer = cache.geolayers.get(metadata["layer_name"])
+    if geolayer is None:
+        geolayer = GeoLayer.objects.create(name=metadata["layer_name"], **fields)
+        cache.geolayers[geolayer.name] = geolayer
+    else:
+        # Relations to the other layers are computed again only if the extent moved
+        fields["relations_dirty"] = geolayer.relations_dirty or geolayer.extent != fields["extent"]
+        for field, value in fields.items():
+            setattr(geolayer, field, value)
+        geolayer.save(update_fields=list(fields))
+
+    attributes = {
+        str(name): fiona_to_postgres_type(attr_type)
+        for name, attr_type in metadata["attributes"].items()
+    }
+    attr_types = cache.get_attribute_types(attributes.values())
+    existing = cache.get_attributes(geolayer)
+
+    removed = [attribute for name, attribute in existing.items() if name not in attributes]
+    if removed:
+        cache.deleted_values += deleted_values(
+            Attribute.objects.filter(pk__in=[attribute.pk for attribute in removed]).delete()
+        )
+        for attribute in removed:
+            del existing[attribute.name]
+
+    retyped = []
+    for attribute in existing.values():
+        attr_type = attr_types[attributes[attribute.name]]
+        if attribute.type_id != attr_type.pk:
+            attribute.type = attr_type
+            retyped.append(attribute)
+    Attribute.objects.bulk_update(retyped, ["type"])
+    # The values of the retyped attributes are written again, typed as such
+    if retyped:
+        cache.deleted_values += deleted_values(AttributeValue.objects.filter(attribute__in=retyped).delete())
+    rewritten = {attribute.name for attribute in retyped}
+
+    created = Attribute.objects.bulk_create([
+        Attribute(name=name, geolayer=geolayer, type=attr_types[attr_type])
+        for name, attr_type in attributes.items()
+        if name not in existing
+    ])
+    rewritten.update(attribute.name for attribute in created)
+    existing.update((attribute.name, attribute) for attribute in created)
+
+    rows = 0
+    for attr_name in attributes:
+        attribute = existing[attr_name]
+        contents = values[attr_name]
+        if attr_name not in rewritten:
+            # {text: value id}
+            stored = dict(
+                AttributeValue.objects.filter(attribute=attribute).values_list("content__text", "pk")
             )
-            geometry, _ = GeometryType.objects.get_or_create(
-                name=geometry_type,
+            for batch in chunked(stored.keys() - set(contents), batch_size):
+                cache.deleted_values += deleted_values(
+                    AttributeValue.objects.filter(pk__in=[stored[content] for content in batch]).delete()
+                )
+            contents = [content for content in contents if content not in stored]
+
+        rows += write_attribute_values(
+            attribute,
+            contents,
+            cache,
+            attr_type=attributes[attr_name],
+            batch_size=batch_size,
+            writer=writer,
+        )
+
+    if statistics is not None:
+        AttributeStatistics.objects.filter(attribute__geolayer=geolayer).delete()
+        AttributeStatistics.objects.bulk_create([
+            AttributeStatistics(attribute=existing[attr_name], **statistics[attr_name])
+            for attr_name in attributes
+        ])
+
+    return rows
+
+
+def create_staged_geolayer(source, fingerprint, metadata, cache):
+    """
+    Create the staging copy of a geolayer with its attributes, and a
+    checkpoint at offset 0 for each of them. A previous copy is replaced.
+    """
+    name = metadata["layer_name"]
+    cache.deleted_values += deleted_values(GeoLayer.objects.filter(name=name, staging=True).delete())
+    ImportCheckpoint.objects.filter(path=fingerprint.path, layer=name).delete()
+    staged = GeoLayer.objects.create(
+        name=name,
+        staging=True,
+        epsg_code=metadata["crs"],
+        geom=cache.get_geometry_type(metadata["geometry_type"]),
+        source=source,
+        extent=extent_polygon(metadata["extent"]),
+    )
+    attributes = {
+        str(name): fiona_to_postgres_type(attr_type)
+        for name, attr_type in metadata["attributes"].items()
+    }
+    attr_types = cache.get_attribute_types(attributes.values())
+    Attribute.objects.bulk_create([
+        Attribute(name=attr_name, geolayer=staged, type=attr_types[attr_type])
+        for attr_name, attr_type in attributes.items()
+    ])
+    ImportCheckpoint.objects.bulk_create([
+        ImportCheckpoint(
+            path=fingerprint.path,
+            size=fingerprint.size,
+            mtime=fingerprint.mtime,
+            checksum=fingerprint.checksum,
+            layer=name,
+            attribute=attr_name,
+        )
+        for attr_name in attributes
+    ])
+    return staged
+
+
+def swap_staged_geolayer(staged, live, cache):
+    """
+    Move the contents of the staging copy of a geolayer into the live layer,
+    then delete the copy: the layer, its attributes and its unchanged values
+    keep their ids. Returns the {name: Attribute} dict of the layer.
+    """
+    fields = ["epsg_code", "geom", "source", "extent"]
+    # Relations to the other layers are computed again only if the extent moved
+    live.relations_dirty = live.relations_dirty or live.extent != staged.extent
+    for field in fields:
+        attname = GeoLayer._meta.get_field(field).attname
+        setattr(live, attname, getattr(staged, attname))
+    live.save(update_fields=fields + ["relations_dirty"])
+
+    staged_attributes = {attribute.name: attribute for attribute in staged.attributes.all()}
+    existing = cache.get_attributes(live)
+    removed = [attribute.pk for name, attribute in existing.items() if name not in staged_attributes]
+    if removed:
+        cache.deleted_values += deleted_values(Attribute.objects.filter(pk__in=removed).delete())
+
+    attributes = {}
+    added = []
+    for name, staged_attribute in staged_attributes.items():
+        attribute = existing.get(name)
+        if attribute is None:
+            # A new attribute is moved to the layer along with its values
+            staged_attribute.geolayer = live
+            added.append(staged_attribute)
+            attributes[name] = staged_attribute
+            continue
+
+        staged_values = AttributeValue.objects.filter(attribute=staged_attribute)
+        live_values = AttributeValue.objects.filter(attribute=attribute)
+        if attribute.type_id != staged_attribute.type_id:
+            # The values of a retyped attribute are all replaced, typed as such
+            attribute.type_id = staged_attribute.type_id
+            attribute.save(update_fields=["type"])
+            cache.deleted_values += deleted_values(live_values.delete())
+        else:
+            # Only the values which are gone or new change
+            cache.deleted_values += deleted_values(
+                live_values.exclude(content__in=staged_values.values("content")).delete()
             )
-            geolayer, _ = GeoLayer.objects.get_or_create(
-                name=layer_name,
-                epsg_code=crs,
-                geom=geometry,
+            staged_values.filter(content__in=live_values.values("content")).delete()
+        staged_values.update(attribute=attribute)
+        attributes[name] = attribute
+    Attribute.objects.bulk_update(added, ["geolayer"])
+
+    # Only the emptied attributes of the copy are left
+    staged.delete()
+    return attributes
+
+
+def write_staged_geolayer(
+    source, fingerprint, metadata, values, cache, statistics=None, resume=False,
+    chunk_size=100_000, batch_size=5000, writer="copy",
+):
+    """
+    Write a geolayer to a staging copy by chunks of `chunk_size` values,
+    each committed along with the checkpoint of its attribute, then swap its
+    contents into the live layer in a single transaction: readers see the
+    layer either before or after the import, never in between, and its ids
+    do not change.
+
+    With `resume`, the staging copy left by an interrupted run on the same
+    file is completed from its checkpoints, the values of an attribute
+    being in the same order as long as the file is unchanged. Returns the
+    number of values written.
+    """
+    name = metadata["layer_name"]
+    attr_names = [str(attr_name) for attr_name in metadata["attributes"]]
+    checkpoints = {
+        checkpoint.attribute: checkpoint
+        for checkpoint in ImportCheckpoint.objects.filter(path=fingerprint.path, layer=name)
+    }
+    staged = GeoLayer.objects.filter(name=name, staging=True, source=source).first()
+    if not (resume and staged and checkpoints.keys() == set(attr_names)):
+        with transaction.atomic():
+            staged = create_staged_geolayer(source, fingerprint, metadata, cache)
+        checkpoints = {
+            checkpoint.attribute: checkpoint
+            for checkpoint in ImportCheckpoint.objects.filter(path=fingerprint.path, layer=name)
+        }
+    attributes = {attribute.name: attribute for attribute in staged.attributes.select_related("type")}
+
+    rows = 0
+    for attr_name in attr_names:
+        attribute = attributes[attr_name]
+        checkpoint = checkpoints[attr_name]
+        for chunk in chunked(values[attr_name][checkpoint.offset:], chunk_size):
+            with transaction.atomic():
+                rows += write_attribute_values(
+                    attribute,
+                    chunk,
+                    cache,
+                    attr_type=attribute.type.name,
+                    batch_size=batch_size,
+                    writer=writer,
+                )
+                checkpoint.offset += len(chunk)
+                checkpoint.save(update_fields=["offset", "updated_at"])
+
+    with transaction.atomic():
+        geolayer = cache.geolayers.get(name)
+        if geolayer is None:
+            geolayer = staged
+            geolayer.staging = False
+            geolayer.save(update_fields=["staging"])
+        else:
+            attributes = swap_staged_geolayer(staged, geolayer, cache)
+        if statistics is not None:
+            AttributeStatistics.objects.filter(attribute__geolayer=geolayer).delete()
+            AttributeStatistics.objects.bulk_create([
+                AttributeStatistics(attribute=attributes[attr_name], **statistics[attr_name])
+                for attr_name in attributes
+            ])
+        ImportCheckpoint.objects.filter(path=fingerprint.path, layer=name).delete()
+    cache.geolayers[name] = geolayer
+    cache.attributes[geolayer.pk] = attributes
+
+    return rows
+
+
+def extract_epsg_from_crs(crs_input):
+    """
+    Given a Fiona CRS input (dict, WKT string, pyproj CRS, etc.),
+    return the EPSG code as int if found, else None.
+    """
+    if crs_input is None:
+        return None
+
+    try:
+        # Parse input into a pyproj CRS object
+        py_crs = CRS.from_user_input(crs_input)
+        epsg = py_crs.to_epsg()
+        return epsg  # will be int or None
+    except Exception:
+        return None
+
+
+def extent_to_wgs84(bounds, crs_input):
+    """
+    Reproject the (minx, miny, maxx, maxy) bounds of a layer to WGS 84.
+
+    Returns None for empty layers and layers without a CRS.
+    """
+    if crs_input is None or bounds is None:
+        return None
+    minx, miny, maxx, maxy = bounds
+    if not all(math.isfinite(coordinate) for coordinate in bounds) or minx > maxx or miny > maxy:
+        return None
+    try:
+        transformer = Transformer.from_crs(CRS.from_user_input(crs_input), "EPSG:4326", always_xy=True)
+        # The edges are densified, as they are no longer straight once reprojected
+        extent = transformer.transform_bounds(minx, miny, maxx, maxy, densify_pts=21)
+    except Exception:
+        return None
+    return extent if all(math.isfinite(coordinate) for coordinate in extent) else None
+
+
+def fiona_geometry_type(ogr_type):
+    """Return the fiona name of an OGR geometry type, e.g. '3D Point' for 'Point Z'"""
+    base, _, dimensions = ogr_type.partition(" ")
+    return f"3D {base}" if "Z" in dimensions else base
+
+
+def list_geometry_layers(filepath):
+    """
+    Return the names and geometry types of the layers of a data file,
+    skipping the attribute-only tables, with a single open of the file.
+    """
+    return [
+        (name, fiona_geometry_type(geometry_type))
+        for name, geometry_type in pyogrio.list_layers(filepath)
+        if geometry_type is not None
+    ]
+
+
+def layer_metadata(src, geometry_type=None):
+    """Return the metadata of an open fiona collection"""
+    try:
+        # Read from the header for most drivers, the layer is only scanned otherwise
+        bounds = src.bounds
+    except Exception:
+        bounds = None
+    return {
+        "layer_name": src.name,
+        "driver": src.driver,
+        "crs": extract_epsg_from_crs(src.crs),
+        "attributes": src.schema["properties"],
+        # Not in the schema of collections opened with ignore_geometry
+        "geometry_type": geometry_type or src.schema["geometry"],
+        "extent": extent_to_wgs84(bounds, src.crs),
+    }
+
+
+def load_metadata_with_fiona(filepath, layer=None):
+    # Open a file for reading. We'll call this the source.
+    with fiona.open(filepath, layer=layer) as src:
+        return layer_metadata(src)
+
+
+def guess_encoding(filepath, sample_bytes=100000):
+    """Detect the encoding of a file using chardet on the first `sample_bytes` bytes."""
+    try:
+        with open(filepath, "rb") as f:
+            raw = f.read(sample_bytes)
+        detected = chardet.detect(raw)
+        encoding = detected['encoding']
+        confidence = detected['confidence']
+        print(f"Chardet guess: {encoding} (confidence: {confidence:.2f})")
+        return encoding, confidence
+    except Exception as err:
+        print(f"Error detecting encoding of {filepath.name} with chardet: {err}")
+        return None, 0.0
+
+
+def get_layer(filepath):
+    """Return the name of the first geometry layer of a data file"""
+    layers = list_geometry_layers(filepath)
+    return layers[0][0] if layers else None
+
+
+def load_data(filepath, encoding=None, layer=None):
+    # Open a file for reading. We'll call this the source.
+    # The detected encoding is tried first, the common ones only as a fallback
+    common_encodings = ['utf-8', 'cp1252', 'ISO-8859-1']
+    if encoding:
+        common_encodings = [encoding] + [e for e in common_encodings if e != encoding]
+    layer = layer or get_layer(filepath)
+    for encoding in common_encodings:
+        print(f"Testing {encoding=} to open file: {filepath.name}...")
+        try:
+            gdf = gpd.read_file(
+                filepath,
+                layer=layer,
+                encoding=encoding,
             )
-            
-            data = extract_unique_value(filepath)
-            
-            # Write attributes and their type
-            for attr_name, attr_type in attributes.items():
-                attr_type, _ = AttributeType.objects.get_or_create(
-                    name=fiona_to_postgres_type(attr_type),
+            print(f"Successfully loaded {filepath.name} with encoding: {encoding}")
+            return gdf
+        except UnicodeDecodeError as err:
+              print(f"UnicodeDecodeError: failed loading {filepath.name} with encoding {encoding}: error={err}")
+
+    if filepath.suffix[1:] == 'shp':
+        dbf_filepath = filepath.with_suffix(".dbf")
+        if not dbf_filepath.is_file():
+            print(f"{dbf_filepath} does not exist!")
+            pass
+
+        encoding, confidence = guess_encoding(dbf_filepath)
+        if encoding and confidence > 0.8:
+            try:
+                gdf = gpd.read_file(
+                    filepath,
+                    layer=layer,
+                    encoding=encoding,
                 )
-                attribute = Attribute.objects.create(
-                    name=str(attr_name),
-                    geolayer=geolayer,
-                    type=attr_type,
+                print(f"Successfully loaded {filepath.name} with guessed encoding: {encoding}")
+                return gdf
+            except UnicodeDecodeError as err:
+                print(f"UnicodeDecodeError: failed loading {filepath.name} with guessed encoding {encoding}: error={err}")
+
+    raise UnicodeDecodeError(f"Failed to decode {filepath.name} with all tried encodings, including guessed one.")
+
+
+def make_columns_unique(gdf):
+    """
+    Rename the duplicated columns in place, e.g. 'name', 'name' to 'name',
+    'name_1'. The data is neither copied nor scanned.
+    """
+    duplicated = gdf.columns.duplicated()
+    if not duplicated.any():
+        return gdf
+
+    new_cols = []
+    counts = {}
+    for col, is_duplicate in zip(gdf.columns, duplicated):
+        if not is_duplicate:
+            counts[col] = 1
+            new_cols.append(col)
+        else: # we've got a duplicate column name
+            counts[col] += 1
+            new_cols.append(f"{col.rstrip('_')}_{counts[col]-1}")
+    gdf.columns = new_cols
+
+    return gdf
+
+
+def count_column_values(series):
+    """Return the {value: count} dict of a column, missing values included"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Already dictionary encoded: the codes are counted without hashing
+        # the values again, missing values have the code -1
+        codes = series.cat.codes.to_numpy()
+        counts = np.bincount(codes + 1, minlength=len(series.cat.categories) + 1).tolist()
+        values = [None] + series.cat.categories.tolist()
+    else:
+        value_counts = series.value_counts(dropna=False, sort=False)
+        counts = value_counts.tolist()
+        values = value_counts.index.tolist()
+    # tolist() converts to Python objects in bulk
+    return {value: count for value, count in zip(values, counts) if count}
+
+
+def get_unique_values(gdf):
+    """Return the unique values of each attribute with their number of occurrences"""
+    # do not take the geometry column into consideration
+    gdf = make_columns_unique(gdf)
+    print("Extracting unique values for each attribute, please wait...")
+    return {
+        column: count_column_values(gdf[column])
+        for column in gdf.columns
+        if column != 'geometry'
+    }
+
+
+def extract_unique_value(filepath, encoding=None, layer=None):
+    gdf = load_data(filepath, encoding=encoding, layer=layer)
+    return get_unique_values(gdf), len(gdf)
+
+
+def count_values(src, max_distinct=1_000_000):
+    """
+    Count the unique values of each attribute by streaming the records of
+    an open fiona collection.
+
+    At most `max_distinct` values are counted per attribute, so the memory
+    used does not depend on the size of the layer. Returns the value counts
+    and the number of records.
+    """
+    # dicts keep the values in order of appearance
+    value_counts = {column: {} for column in src.schema["properties"]}
+    truncated = set()
+    rows = 0
+    for feature in src:
+        rows += 1
+        for column, value in feature.properties.items():
+            counts = value_counts[column]
+            if value in counts:
+                counts[value] += 1
+            elif len(counts) < max_distinct:
+                counts[value] = 1
+            else:
+                truncated.add(column)
+
+    for column in truncated:
+        print(f"More than {max_distinct} distinct values in {src.name}:{column}, extra values ignored")
+
+    return value_counts, rows
+
+
+def stream_unique_values(filepath, layer=None, encoding=None, max_distinct=1_000_000):
+    """Count the unique values of each attribute of a layer, without reading the geometries"""
+    with fiona.open(filepath, layer=layer, encoding=encoding, ignore_geometry=True) as src:
+        return count_values(src, max_distinct=max_distinct)
+
+
+def is_null(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def profile_values(counts, rows, max_distinct=None, top=10):
+    """
+    Compute the statistics of an attribute from the counts of its values.
+
+    Statistics only cover the counted values: if the number of distinct
+    values reached `max_distinct`, the distinct count is a lower bound and
+    the other figures are approximations.
+    """
+    null_count = int(sum(count for value, count in counts.items() if is_null(value)))
+    values = [(value, count) for value, count in counts.items() if not is_null(value)]
+    numeric = [
+        (value, count)
+        for value, count in values
+        if isinstance(value, numbers.Real) and not isinstance(value, bool)
+    ]
+    lengths = [len(value) for value, count in values if isinstance(value, str)]
+    counted = sum(count for value, count in numeric)
+
+    return {
+        "row_count": rows,
+        "null_count": null_count,
+        "distinct_count": len(counts),
+        "distinct_truncated": max_distinct is not None and len(counts) >= max_distinct,
+        "top_values": [
+            [str(value), int(count)]
+            for value, count in heapq.nlargest(top, counts.items(), key=itemgetter(1))
+        ],
+        "min_value": float(min(value for value, count in numeric)) if numeric else None,
+        "max_value": float(max(value for value, count in numeric)) if numeric else None,
+        "mean_value": float(sum(value * count for value, count in numeric) / counted) if counted else None,
+        "min_length": min(lengths) if lengths else None,
+        "max_length": max(lengths) if lengths else None,
+    }
+
+
+class LayerScan(NamedTuple):
+    metadata: dict
+    values: dict
+    statistics: dict
+
+
+class ScanResult(NamedTuple):
+    filepath: Path
+    layers: list
+    timings: dict
+
+
+def profile_path(profile_dir, filepath, stage):
+    """Path of the cProfile dump of a stage of the import of a file"""
+    digest = hashlib.md5(str(filepath).encode()).hexdigest()[:8]
+    return Path(profile_dir) / f"{Path(filepath).stem}-{digest}.{stage}.prof"
+
+
+def scan_file(filepath, encoding=None, reader="stream", max_distinct=1_000_000, profile_dir=None):
+    """
+    Read the metadata, the unique values and their statistics of every
+    geometry layer of a data file.
+
+    The layers are listed in a single open of the file, then each layer is
+    opened once to read its schema, CRS and bounds and to stream its
+    records. This is run in worker processes and must not touch the
+    database: values are sent back as deduplicated strings to keep the
+    result compact, along with the time spent in each stage.
+    """
+    profiler = cProfile.Profile() if profile_dir else None
+    if profiler:
+        profiler.enable()
+
+    timings = {"read_metadata": 0.0, "read_values": 0.0, "profile_values": 0.0}
+    start = time.perf_counter()
+    geometry_layers = list_geometry_layers(filepath)
+    timings["read_metadata"] += time.perf_counter() - start
+
+    layers = []
+    for layer, geometry_type in geometry_layers:
+        start = time.perf_counter()
+        with fiona.open(filepath, layer=layer, encoding=encoding, ignore_geometry=reader == "stream") as src:
+            metadata = layer_metadata(src, geometry_type)
+            timings["read_metadata"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            if reader == "stream":
+                value_counts, rows = count_values(src, max_distinct=max_distinct)
+        if reader != "stream":
+            value_counts, rows = extract_unique_value(filepath, encoding=encoding, layer=layer)
+            max_distinct = None
+        values = {
+            column: list(dict.fromkeys(str(value) for value in counts))
+            for column, counts in value_counts.items()
+        }
+        timings["read_values"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        statistics = {
+            column: profile_values(counts, rows, max_distinct=max_distinct)
+            for column, counts in value_counts.items()
+        }
+        timings["profile_values"] += time.perf_counter() - start
+        layers.append(LayerScan(metadata, values, statistics))
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(profile_path(profile_dir, filepath, "scan"))
+    return ScanResult(filepath, layers, timings)
+
+
+def scan_files(filepaths, workers=1, encodings=None, **options):
+    """Yield `scan_file` results, in a pool of `workers` processes if more than one"""
+    scan = partial(scan_file, **options)
+    encodings = encodings or {}
+    if workers <= 1:
+        for filepath in filepaths:
+            yield scan(filepath, encoding=encodings.get(filepath))
+        return
+
+    # Workers are spawned rather than forked: a forked worker would inherit
+    # the sockets of the parent's connection and of its connection pool.
+    # They set Django up to import this module, but never use the database.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    ) as executor:
+        futures = [
+            executor.submit(scan, filepath, encoding=encodings.get(filepath))
+            for filepath in filepaths
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# Define your Class commands here
+class Command(BaseCommand):
+    help = """Import layer and attribute data from a data directory holding
+    ESRI Shapefiles and Geopackages"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--data-dir",
+            default=settings.DATA_DIR,
+            help="Directory holding the data files (default: settings.DATA_DIR)",
+        )
+        parser.add_argument(
+            "--writer",
+            choices=["copy", "bulk"],
+            default="copy",
+            help="How attribute values are written: a COPY stream or chunked bulk inserts",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of rows per INSERT statement with the 'bulk' writer",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes reading the data files in parallel",
+        )
+        parser.add_argument(
+            "--reader",
+            choices=["stream", "geopandas"],
+            default="stream",
+            help="Stream the attributes without geometries, or load whole layers with geopandas",
+        )
+        parser.add_argument(
+            "--max-distinct",
+            type=int,
+            default=1_000_000,
+            help="Maximum number of distinct values kept per attribute by the 'stream' reader",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only import new or changed files and prune deleted ones, instead of a full reload",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Resume an interrupted run from its checkpoints, instead of starting over",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100_000,
+            help="Number of values written per transaction: larger layers are written by chunks "
+            "to a staging copy, swapped with the layer once complete",
+        )
+        parser.add_argument(
+            "--checksum",
+            action="store_true",
+            help="Compare files on their SHA-256 hash rather than on their size and modification time",
+        )
+        parser.add_argument(
+            "--profile",
+            metavar="DIR",
+            help="Write cProfile dumps of the slowest files to this directory",
+        )
+        parser.add_argument(
+            "--profile-top",
+            type=int,
+            default=5,
+            help="Number of slowest files whose profile is kept",
+        )
+        add_manifest_arguments(parser)
+        add_instrumentation_arguments(parser)
+
+    def handle(self, *args, **kwargs):
+        """Docstring"""
+        self.instrumentation = Instrumentation("load_data")
+        # Layers are committed one by one: the catalogue pages are not
+        # cached until the run is finished
+        run = ImportRun.start("load_data")
+        with self.instrumentation.capture():
+            self.import_data(**kwargs)
+        run.finish()
+        self.instrumentation.report(self.stdout, **kwargs)
+        self.stdout.write(self.style.SUCCESS("Data imported successfully."))
+
+    def import_data(self, **kwargs):
+        instrumentation = self.instrumentation
+        writer = kwargs["writer"]
+        batch_size = kwargs["batch_size"]
+        workers = kwargs["workers"]
+        incremental = kwargs["incremental"]
+        resume = kwargs["resume"]
+        chunk_size = kwargs["chunk_size"]
+        profile_dir = kwargs["profile"]
+        if profile_dir:
+            Path(profile_dir).mkdir(parents=True, exist_ok=True)
+        directory = kwargs["data_dir"]
+        print(f"Data {directory=}")
+        with instrumentation.stage("discover"):
+            manifest = FileManifest(Path(settings.CACHE_DIR) / "manifest.json", directory)
+            manifest.scan(fast=kwargs["fast_scan"], prune=kwargs["prune"])
+            manifest.save()
+            filepaths = [Path(entry.path) for entry in manifest.entries("data")]
+        instrumentation.add_rows("discover", len(filepaths))
+        with instrumentation.stage("fingerprint"):
+            # Sizes and modification times come from the manifest, files are
+            # only read to compute their checksum
+            fingerprints = {
+                filepath: (
+                    file_fingerprint(filepath, checksum=True)
+                    if kwargs["checksum"]
+                    else manifest.fingerprint(filepath)
                 )
-                value_array = data[attr_name]
-                for value in value_array:
-                    attribute_value = AttributeValue.objects.create(
-                        content=str(value),
-                        geolayer=geolayer,
-                        attribute=attribute,
+                for filepath in filepaths
+            }
+
+        with instrumentation.stage("delete"):
+            deleted = 0
+            if not resume:
+                # Staging copies and checkpoints left by an interrupted run
+                deleted += deleted_values(GeoLayer.objects.filter(staging=True).delete())
+                ImportCheckpoint.objects.all().delete()
+            sources = {source.path: source for source in SourceFile.objects.all()}
+            # Prune the files which are gone, along with their layers
+            removed = sources.keys() - {fingerprint.path for fingerprint in fingerprints.values()}
+            deleted += deleted_values(SourceFile.objects.filter(path__in=removed).delete())
+            ImportCheckpoint.objects.filter(path__in=removed).delete()
+            # Files whose import was interrupted are never skipped
+            unfinished = set(ImportCheckpoint.objects.values_list("path", flat=True))
+            last_run = (
+                ImportRun.objects.filter(command="load_data", finished_at__isnull=False).order_by("-pk").first()
+            )
+
+            def imported(fingerprint):
+                source = sources.get(fingerprint.path)
+                if source is None or not source.matches(fingerprint) or fingerprint.path in unfinished:
+                    return False
+                # A full reload being resumed skips the files imported since the last completed run
+                return incremental or (resume and (last_run is None or source.imported_at > last_run.finished_at))
+
+            filepaths = [filepath for filepath, fingerprint in fingerprints.items() if not imported(fingerprint)]
+            self.stdout.write(
+                f"{len(filepaths)} files to import, "
+                f"{len(fingerprints) - len(filepaths)} skipped, {len(removed)} removed"
+            )
+
+        # Lookup tables are loaded once the deletions are done
+        with instrumentation.stage("load_lookups"):
+            cache = ImportCache()
+            cache.deleted_values = deleted
+
+        # Detect the encodings once, files are then opened with the right codec
+        with instrumentation.stage("detect_encoding"):
+            encoding_cache = EncodingCache(Path(settings.CACHE_DIR) / "encodings.json")
+            encodings = {
+                filepath: encoding_cache.get(filepath, fingerprints[filepath])
+                for filepath in filepaths
+            }
+            encoding_cache.save()
+
+        scanned = scan_files(
+            filepaths,
+            workers=workers,
+            encodings=encodings,
+            reader=kwargs["reader"],
+            max_distinct=kwargs["max_distinct"],
+            profile_dir=profile_dir,
+        )
+        for filepath, layers, timings in scanned:
+            instrumentation.record("read_metadata", timings["read_metadata"])
+            instrumentation.record(
+                "read_values",
+                timings["read_values"],
+                rows=sum(len(values) for layer in layers for values in layer.values.values()),
+            )
+            instrumentation.record("profile_values", timings["profile_values"])
+
+            profiler = cProfile.Profile() if profile_dir else None
+            if profiler:
+                profiler.enable()
+            start = time.perf_counter()
+            rows = 0
+            with instrumentation.stage("write"):
+                fingerprint = fingerprints[filepath]
+                fingerprint_fields = {
+                    "size": fingerprint.size,
+                    "mtime": fingerprint.mtime,
+                    "checksum": fingerprint.checksum,
+                }
+                with transaction.atomic():
+                    # The checkpoints of a file which changed since are worthless
+                    checkpoint = ImportCheckpoint.objects.filter(path=fingerprint.path, layer="", attribute="").first()
+                    if checkpoint is not None and not checkpoint.matches(fingerprint):
+                        ImportCheckpoint.objects.filter(path=fingerprint.path).delete()
+                    # The file keeps its previous fingerprint until all its
+                    # layers are written, and has a checkpoint until then
+                    source, _ = SourceFile.objects.get_or_create(path=fingerprint.path, defaults=fingerprint_fields)
+                    ImportCheckpoint.objects.update_or_create(
+                        path=fingerprint.path, layer="", attribute="", defaults=fingerprint_fields
                     )
 
-        self.stdout.write(self.style.SUCCESS("Data imported successfully."))
+                skipped = False
+                for metadata, data, statistics in layers:
+                    layer_name, driver, crs, attributes, geometry_type, extent = metadata.values()
+                    print(
+                        f"{80*'#'}\nScanned layer \"{layer_name}\" of file \"{filepath}\":\n"
+                        f"{80*'#'}\n{driver=}\n{crs=}\n{attributes=}\n{geometry_type=}\n{extent=}"
+                    )
+                    # Layers are named alike in the catalogue: the layer of
+                    # another file would be overwritten
+                    other = cache.geolayers.get(layer_name)
+                    if other is not None and other.source_id not in (None, source.pk):
+                        self.stdout.write(self.style.WARNING(
+                            f"Skipped layer {layer_name} of {filepath}: "
+                            f"a layer of that name comes from {other.source.path}"
+                        ))
+                        skipped = True
+                        continue
+                    layer_start = time.perf_counter()
+                    if sum(len(values) for values in data.values()) <= chunk_size:
+                        # A single chunk: the layer is updated in place, in one transaction
+                        with transaction.atomic():
+                            layer_rows = sync_geolayer(
+                                source,
+                                metadata,
+                                data,
+                                cache,
+                                statistics=statistics,
+                                batch_size=batch_size,
+                                writer=writer,
+                            )
+                    else:
+                        layer_rows = write_staged_geolayer(
+                            source,
+                            fingerprint,
+                            metadata,
+                            data,
+                            cache,
+                            statistics=statistics,
+                            resume=resume,
+                            chunk_size=chunk_size,
+                            batch_size=batch_size,
+                            writer=writer,
+                        )
+                    layer_elapsed = time.perf_counter() - layer_start
+                    rows += layer_rows
+                    self.stdout.write(
+                        f"Wrote {layer_rows} values for layer {layer_name} in {layer_elapsed:.2f}s "
+                        f"({layer_rows / max(layer_elapsed, 1e-9):.0f} rows/s)"
+                    )
+
+                with transaction.atomic():
+                    # Prune the layers which are gone from the file
+                    layer_names = {layer.metadata["layer_name"] for layer in layers}
+                    removed = GeoLayer.live.filter(source=source).exclude(name__in=layer_names)
+                    for geolayer in removed:
+                        cache.forget_geolayer(geolayer)
+                    cache.deleted_values += deleted_values(removed.delete())
+                    if skipped:
+                        # The file keeps its checkpoint: it is imported again
+                        # by the next runs, until the other layer is gone
+                        ImportCheckpoint.objects.filter(path=fingerprint.path).exclude(layer="").delete()
+                    else:
+                        for field, value in fingerprint_fields.items():
+                            setattr(source, field, value)
+                        source.save()
+                        ImportCheckpoint.objects.filter(path=fingerprint.path).delete()
+            elapsed = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(profile_path(profile_dir, filepath, "write"))
+
+            instrumentation.add_rows("write", rows)
+            instrumentation.record_file(filepath, sum(timings.values()) + elapsed)
+
+        # The whole dictionary is scanned: only if values were deleted
+        if cache.deleted_values:
+            with instrumentation.stage("prune_texts"):
+                pruned = prune_value_texts()
+            instrumentation.add_rows("prune_texts", pruned)
+
+        if profile_dir:
+            # Only keep the profiles of the slowest files
+            slowest = set(instrumentation.slowest_files(kwargs["profile_top"]))
+            for filepath in instrumentation.files.keys() - slowest:
+                for stage in ("scan", "write"):
+                    profile_path(profile_dir, filepath, stage).unlink(missing_ok=True)
@@ -1,96 +1,146 @@
-import re
+import json
 from pathlib import Path
 
-from sqlalchemy import create_engine, text, select, Table, MetaData
+from sqlalchemy import create_engine, select, Table, MetaData
 import pandas as pd
-from pyproj import CRS
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from iqs.models import Attribute, AttributeType, GeoLayer, GeometryType, AttributeValue
-# %%
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from iqs.instrumentation import Instrumentation, add_instrumentation_arguments
+from iqs.manifest import FileManifest, add_manifest_arguments
+from iqs.models import GeoLayer, ImportRun, MetadataMismatch
+
+# Table of the metadata database describing the data files
+METADATA_TABLE = "metadonnees"
+# Column of the metadata table holding the name of the data file
+FILENAME_COLUMN = "nom_bdd"
+
+
+def load_data_filepath(filepaths: list) -> pd.DataFrame:
+    return pd.DataFrame({
+        "filepath": [str(p) for p in filepaths],
+        "filename": [p.name for p in filepaths],
+    })
+
+
+def read_metadata_table(filepath: Path, table=METADATA_TABLE) -> pd.DataFrame:
+    """Read the metadata table of a SQLite database, without reflecting the other tables"""
+    engine = create_engine(f"sqlite:////{filepath.as_posix()}", future=True)
+    try:
+        metadata_table = Table(table, MetaData(), autoload_with=engine)
+        with engine.connect() as connection:
+            return pd.read_sql(select(metadata_table), con=connection)
+    finally:
+        engine.dispose()
+
+
+def compare_filenames(df_files, df_metadata, db_column=FILENAME_COLUMN, filename_col="filename"):
+    """
+    Match the data files on disk with the entries of the metadata table.
+
+    Returns the files which are not described in the metadata and the
+    names of the entries which have no file on disk.
+    """
+    merged = df_files[[filename_col, "filepath"]].merge(
+        df_metadata[[db_column]].drop_duplicates(),
+        how="outer",
+        left_on=filename_col,
+        right_on=db_column,
+        indicator=True,
+    )
+    not_in_metadata = merged.loc[merged["_merge"] == "left_only", [filename_col, "filepath"]]
+    not_on_disk = merged.loc[merged["_merge"] == "right_only", db_column]
+    return not_in_metadata, not_on_disk
+
+
+def metadata_by_filename(df_metadata, db_column=FILENAME_COLUMN):
+    """Return the metadata entries as JSON-compatible dicts, by file name"""
+    # to_json turns NaN into null and dates into ISO strings, as JSONField needs
+    records = json.loads(
+        df_metadata.drop_duplicates(db_column).to_json(orient="records", date_format="iso", force_ascii=False)
+    )
+    return {record[db_column]: record for record in records}
+
+
 # Define your Class commands here
 class Command(BaseCommand):
-    help = """Import layer and attribute data from a data directory holding
-    ESRI Shapefiles and Geopackages"""
+    help = """Attach the entries of the metadata database to the imported
+    geolayers, and report the data files and entries without a counterpart"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--data-dir",
+            default=settings.DATA_DIR,
+            help="Directory holding the data files and the metadata database",
+        )
+        parser.add_argument(
+            "--metadata-db",
+            help="SQLite metadata database, by default the first .db file of the data directory",
+        )
+        add_manifest_arguments(parser)
+        add_instrumentation_arguments(parser)
 
     def handle(self, *args, **kwargs):
         """Docstring"""
-        directory = settings.DATA_DIR
+        instrumentation = Instrumentation("load_metadata")
+        run = ImportRun.start("load_metadata")
+        with instrumentation.capture():
+            self.parse_metadata(instrumentation, **kwargs)
+        run.finish()
+        instrumentation.report(self.stdout, **kwargs)
+        self.stdout.write(self.style.SUCCESS("Metadata parsed successfully."))
+
+    def parse_metadata(self, instrumentation, data_dir, metadata_db=None, fast_scan=False, prune=(), **kwargs):
+        directory = data_dir
         print(f"Data {directory=}")
-        data_extensions_to_fetch = {".shp", ".gpkg"}
-        metadata_extensions_to_fetch = {".db"}
-        data_filepaths = list(
-            p.resolve()
-            for p in Path(directory).glob("**/*")
-            if p.suffix in data_extensions_to_fetch
-        )
-        metadata_filepaths = list(
-            p.resolve()
-            for p in Path(directory).glob("**/*")
-            if p.suffix in metadata_extensions_to_fetch
-        )
+        # A single walk of the data directory, shared with load_data
+        with instrumentation.stage("discover"):
+            manifest = FileManifest(Path(settings.CACHE_DIR) / "manifest.json", directory)
+            manifest.scan(fast=fast_scan, prune=prune)
+            manifest.save()
+            data_filepaths = [Path(entry.path) for entry in manifest.entries("data")]
+            metadata_filepaths = [Path(entry.path) for entry in manifest.entries("metadata")]
+        instrumentation.add_rows("discover", len(data_filepaths) + len(metadata_filepaths))
 
+        if metadata_db:
+            metadata_filepath = Path(metadata_db)
+        elif metadata_filepaths:
+            metadata_filepath = metadata_filepaths[0]
+        else:
+            raise CommandError(f"No metadata database found in {directory}")
 
-        def load_data_filepath(filepaths: list) -> pd.DataFrame:
-            return pd.DataFrame({
-                "filepath": filepaths,
-                "filename": [p.name for p in filepaths],
-                "filename_without_extension": [p.stem for p in filepaths],  # filename without extension
-                "extension": [p.suffix for p in filepaths]
-            })
-
-
-        def compare_filenames(df_files, df_metadata, db_column="nom_bdd", filename_col="filename_without_extension"):
-            """Compare two dataframes and tell if a file is present on disk or in the metadata"""
-            db_filenames = set(df_metadata[db_column])
-            disk_filenames = set(df_files[filename_col])
-            # Copy to avoid mutating input DataFrames
-            df_files = df_files.copy()
-            df_metadata = df_metadata.copy()
-
-            # Add boolean columns
-            df_files["in_metadata"] = df_files[filename_col].isin(db_filenames)
-            df_metadata["on_disk"] = df_metadata[db_column].isin(disk_filenames)
-            
-            not_in_db = disk_filenames - db_filenames
-            not_on_disk = db_filenames - disk_filenames
-            
-            return_dataset = False
-            if return_dataset:
-                return (
-                    df_files[df_files[filename_col].isin(not_in_db)],
-                    df_metadata[df_metadata[db_column].isin(not_on_disk)]
-                )
-            else:
-                df_files.to_csv(f"{directory}/files.csv", sep=";")
-                df_metadata.to_csv(f"{directory}/metadata.csv", sep=";")
-                return df_files, df_metadata
-
-
-        def load_metadata(filepath: Path) -> dict:
-            """Load metadata tables into a dict containing DataFrames"""
-            engine = create_engine(f"sqlite:////{filepath.as_posix()}", future=True)
-            metadata = MetaData()
-            metadata.reflect(bind=engine)
-            # Reflect all available table names from the DB
-            available_tables = metadata.tables.keys()
-            print(f"Detected tables: {list(available_tables)}")
-
-            return {
-                table: pd.read_sql(
-                    f'SELECT * FROM "{table}"',  # quotes for safety
-                    con=engine,
-                )
-                for table in available_tables
-            }
-
-        # Connect to the SQLite database
-        tables = load_metadata(metadata_filepaths[0])
-        df_metadata = tables['metadonnees']
+        with instrumentation.stage("read_metadata"):
+            df_metadata = read_metadata_table(metadata_filepath)
+        instrumentation.add_rows("read_metadata", len(df_metadata))
         df_files = load_data_filepath(data_filepaths)
-        
-        res = compare_filenames(df_files, df_metadata, db_column="nom_bdd", filename_col="filename")
 
-        self.stdout.write(self.style.SUCCESS("Metadata parsed successfully."))
+        with instrumentation.stage("compare"):
+            not_in_metadata, not_on_disk = compare_filenames(df_files, df_metadata)
+        instrumentation.add_rows("compare", len(df_files) + len(df_metadata))
+
+        with instrumentation.stage("write"), transaction.atomic():
+            # The report only lists the mismatches of the last run
+            MetadataMismatch.objects.all().delete()
+            MetadataMismatch.objects.bulk_create([
+                MetadataMismatch(kind=MetadataMismatch.NOT_IN_METADATA, filename=filename, path=filepath)
+                for filename, filepath in not_in_metadata.itertuples(index=False)
+            ] + [
+                MetadataMismatch(kind=MetadataMismatch.NOT_ON_DISK, filename=filename)
+                for filename in not_on_disk
+            ])
 
-# %%
+            entries = metadata_by_filename(df_metadata)
+            geolayers = []
+            for geolayer in GeoLayer.live.filter(source__isnull=False).select_related("source").only("metadata", "source__path"):
+                metadata = entries.get(Path(geolayer.source.path).name, {})
+                if geolayer.metadata != metadata:
+                    geolayer.metadata = metadata
+                    geolayers.append(geolayer)
+            GeoLayer.objects.bulk_update(geolayers, ["metadata"], batch_size=1000)
+        instrumentation.add_rows("write", len(geolayers))
+
+        print(
+            f"{len(not_in_metadata)} files not described in the metadata, "
+            f"{len(not_on_disk)} metadata entries without a file, "
+            f"metadata of {len(geolayers)} layers updated"
+        )
@@ -0,0 +1,142 @@
+import json
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+from iqs.fingerprints import SHAPEFILE_SUFFIXES, Fingerprint
+
+# Kind of the files listed in the manifest, by suffix; other files are ignored
+KINDS = {
+    ".shp": "data",
+    ".gpkg": "data",
+    ".db": "metadata",
+    **{suffix: "companion" for suffix in SHAPEFILE_SUFFIXES if suffix != ".shp"},
+}
+
+# Directories which are never descended into, e.g. NFS snapshots
+DEFAULT_PRUNE = [".git", ".snapshot", "__MACOSX"]
+
+
+def add_manifest_arguments(parser):
+    """Add the options of `FileManifest.scan` to a command parser"""
+    parser.add_argument(
+        "--fast-scan",
+        action="store_true",
+        help="Only list the directories whose modification time changed since the last scan",
+    )
+    parser.add_argument(
+        "--prune",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="Do not descend into directories with this name (can be repeated)",
+    )
+
+
+class ManifestEntry(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    kind: str
+
+
+class FileManifest:
+    """
+    Data files found under a root directory, persisted as JSON along with
+    the modification time of each directory.
+
+    Directories are listed with os.scandir, which gives the file types
+    without a stat call per entry. A fast scan only lists again the
+    directories whose modification time changed: files added, removed or
+    renamed are seen, files rewritten in place are not.
+    """
+
+    def __init__(self, path, root):
+        self.path = Path(path)
+        self.root = str(Path(root).resolve())
+        try:
+            self.roots = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.roots = {}
+        self.directories = self.roots.get(self.root, {})
+        self.changed = False
+
+    @staticmethod
+    def list_directory(directory, mtime):
+        files = {}
+        subdirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                    continue
+                kind = KINDS.get(os.path.splitext(entry.name)[1].lower())
+                if kind and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = [stat.st_size, stat.st_mtime, kind]
+        return {"mtime": mtime, "files": files, "subdirs": sorted(subdirs)}
+
+    def scan(self, fast=False, prune=()):
+        """Walk the root directory, and return the number of directories listed"""
+        prune = set(DEFAULT_PRUNE).union(prune)
+        directories = {}
+        listed = 0
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+                cached = self.directories.get(directory)
+                if fast and cached and cached["mtime"] == mtime:
+                    listing = cached
+                else:
+                    listing = self.list_directory(directory, mtime)
+                    listed += 1
+            except OSError:
+                # Removed or unreadable since it was found
+                continue
+            directories[directory] = listing
+            stack.extend(
+                os.path.join(directory, name) for name in reversed(listing["subdirs"]) if name not in prune
+            )
+
+        if directories != self.directories:
+            self.directories = directories
+            self.changed = True
+        return listed
+
+    def entries(self, kind=None):
+        """Return the files of the manifest, of the given kind, sorted by path"""
+        return sorted(
+            ManifestEntry(os.path.join(directory, name), size, mtime, file_kind)
+            for directory, listing in self.directories.items()
+            for name, (size, mtime, file_kind) in listing["files"].items()
+            if kind is None or file_kind == kind
+        )
+
+    def fingerprint(self, filepath):
+        """
+        Return the fingerprint of a data file and its companion files from
+        the manifest, as `file_fingerprint` would without a checksum.
+        """
+        filepath = Path(filepath)
+        files = self.directories[str(filepath.parent)]["files"]
+        if filepath.suffix.lower() == ".shp":
+            names = [filepath.with_suffix(suffix).name for suffix in SHAPEFILE_SUFFIXES]
+        else:
+            names = [filepath.name]
+        size = 0
+        mtime = 0.0
+        for name in names:
+            if name in files:
+                size += files[name][0]
+                mtime = max(mtime, files[name][1])
+        return Fingerprint(path=str(filepath), size=size, mtime=mtime)
+
+    def save(self):
+        if not self.changed:
+            return
+        self.roots[self.root] = self.directories
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self.roots))
+        self.changed = False
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 15:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('mtime', models.FloatField()),
+                ('checksum', models.CharField(blank=True, default='', max_length=64)),
+                ('imported_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='attribute',
+            name='name',
+            field=models.CharField(max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='geolayer',
+            name='source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='geolayers', to='iqs.sourcefile'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 15:54
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0002_sourcefile_alter_attribute_name_geolayer_source'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attributevalue',
+            index=models.Index(models.F('attribute'), django.db.models.functions.comparison.Collate('content', 'C'), name='iqs_value_attribute_content'),
+        ),
+    ]
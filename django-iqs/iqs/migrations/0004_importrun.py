@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 15:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0003_attributevalue_iqs_value_attribute_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('command', models.CharField(max_length=64)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 15:56
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0004_importrun'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='attribute',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='iqs_attribute_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='attributevalue',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['content'], name='iqs_value_content_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='geolayer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='iqs_geolayer_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 15:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0005_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributeStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_count', models.BigIntegerField()),
+                ('null_count', models.BigIntegerField()),
+                ('distinct_count', models.BigIntegerField()),
+                ('distinct_truncated', models.BooleanField(default=False)),
+                ('top_values', models.JSONField(default=list)),
+                ('min_value', models.FloatField(blank=True, null=True)),
+                ('max_value', models.FloatField(blank=True, null=True)),
+                ('mean_value', models.FloatField(blank=True, null=True)),
+                ('min_length', models.IntegerField(blank=True, null=True)),
+                ('max_length', models.IntegerField(blank=True, null=True)),
+                ('attribute', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='iqs.attribute')),
+            ],
+            options={
+                'verbose_name': 'Attribute statistics',
+                'verbose_name_plural': 'Attribute statistics',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 16:01
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0006_attributestatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geolayer',
+            name='extent',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, null=True, srid=4326),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_relation_types(apps, schema_editor):
+    OgcRelationType = apps.get_model("iqs", "OgcRelationType")
+    for name, label in OgcRelationType._meta.get_field("name").choices:
+        OgcRelationType.objects.get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0007_geolayer_extent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geolayer',
+            name='relations_dirty',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='LayerRelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geolayer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relations', to='iqs.geolayer')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='iqs.geolayer')),
+                ('relation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='iqs.ogcrelationtype')),
+            ],
+            options={
+                'verbose_name': 'Layer relation',
+                'verbose_name_plural': 'Layer relations',
+                'unique_together': {('geolayer', 'other')},
+            },
+        ),
+        migrations.RunPython(seed_relation_types, migrations.RunPython.noop),
+    ]
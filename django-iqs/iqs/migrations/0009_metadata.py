@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 16:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0008_layerrelation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetadataMismatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('not_in_metadata', 'File not described in the metadata'), ('not_on_disk', 'Metadata entry without a file')], max_length=32)),
+                ('filename', models.CharField(max_length=1024)),
+                ('path', models.CharField(blank=True, default='', max_length=1024)),
+                ('detected_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Metadata mismatch',
+                'verbose_name_plural': 'Metadata mismatches',
+            },
+        ),
+        migrations.AddField(
+            model_name='geolayer',
+            name='metadata',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-17 16:10
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def fill_value_texts(apps, schema_editor):
+    """Move the contents of the values to the dictionary, each text once"""
+    AttributeValue = apps.get_model("iqs", "AttributeValue")
+    if not AttributeValue.objects.exists():
+        return
+    schema_editor.execute("""
+        INSERT INTO iqs_valuetext (hash, text)
+        SELECT DISTINCT md5(old_content)::uuid, old_content FROM iqs_attributevalue
+    """)
+    schema_editor.execute("""
+        UPDATE iqs_attributevalue attribute_value SET content_id = value_text.id
+        FROM iqs_valuetext value_text
+        WHERE value_text.hash = md5(attribute_value.old_content)::uuid
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0009_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValueText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.UUIDField(unique=True)),
+                ('text', models.CharField(max_length=1024)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(django.db.models.functions.comparison.Collate('text', 'C'), name='iqs_valuetext_text'),
+                    django.contrib.postgres.indexes.GinIndex(fields=['text'], name='iqs_valuetext_text_trgm', opclasses=['gin_trgm_ops']),
+                ],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='attributevalue',
+            name='iqs_value_attribute_content',
+        ),
+        migrations.RemoveIndex(
+            model_name='attributevalue',
+            name='iqs_value_content_trgm',
+        ),
+        migrations.AlterUniqueTogether(
+            name='attributevalue',
+            unique_together=set(),
+        ),
+        migrations.RenameField(
+            model_name='attributevalue',
+            old_name='content',
+            new_name='old_content',
+        ),
+        migrations.AddField(
+            model_name='attributevalue',
+            name='content',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attribute_values', to='iqs.valuetext'),
+        ),
+        migrations.RunPython(fill_value_texts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 16:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Apart from 0010: the table cannot be altered in the transaction which
+    # filled the new column
+
+    dependencies = [
+        ('iqs', '0010_valuetext'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='attributevalue',
+            name='old_content',
+        ),
+        migrations.RemoveField(
+            model_name='attributevalue',
+            name='geolayer',
+        ),
+        migrations.AlterField(
+            model_name='attributevalue',
+            name='content',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='attribute_values', to='iqs.valuetext'),
+        ),
+        migrations.AlterField(
+            model_name='attributevalue',
+            name='attribute',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='iqs.attribute'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='attributevalue',
+            unique_together={('attribute', 'content')},
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2 on 2026-10-17 16:22
+
+import datetime
+import math
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Copy of iqs.typed_values as of this migration, which must not change with it
+TYPED_FIELDS = {
+    "INTEGER": "number",
+    "DOUBLE PRECISION": "number",
+    "TIMESTAMP": "timestamp",
+    "DATE": "timestamp",
+    "BOOLEAN": "boolean",
+}
+
+BOOLEANS = {"true": True, "1": True, "false": False, "0": False}
+
+
+def typed_values(type_name, text):
+    """Return the typed columns of a value of an attribute type, {} if it does not parse"""
+    field = TYPED_FIELDS.get(type_name)
+    try:
+        if field == "number":
+            number = float(text)
+            return {field: number} if math.isfinite(number) else {}
+        if field == "timestamp":
+            value = datetime.datetime.fromisoformat(text.strip())
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value, datetime.timezone.utc)
+            return {field: value}
+        if field == "boolean" and text.strip().lower() in BOOLEANS:
+            return {field: BOOLEANS[text.strip().lower()]}
+    except ValueError:
+        pass
+    return {}
+
+
+def fill_typed_values(apps, schema_editor):
+    """Type the values of the attributes of numeric, date and boolean types"""
+    Attribute = apps.get_model("iqs", "Attribute")
+    AttributeValue = apps.get_model("iqs", "AttributeValue")
+    attributes = Attribute.objects.filter(type__name__in=TYPED_FIELDS).select_related("type")
+    for attribute in attributes.iterator():
+        values = []
+        for value in AttributeValue.objects.filter(attribute=attribute).select_related("content").iterator():
+            for field, typed in typed_values(attribute.type.name, value.content.text).items():
+                setattr(value, field, typed)
+                values.append(value)
+        AttributeValue.objects.bulk_update(values, ["number", "timestamp", "boolean"], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0011_attributevalue_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attributevalue',
+            name='boolean',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attributevalue',
+            name='number',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attributevalue',
+            name='timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_typed_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='attributevalue',
+            index=models.Index(condition=models.Q(('number__isnull', False)), fields=['attribute', 'number'], name='iqs_value_attribute_number'),
+        ),
+        migrations.AddIndex(
+            model_name='attributevalue',
+            index=models.Index(condition=models.Q(('timestamp__isnull', False)), fields=['attribute', 'timestamp'], name='iqs_value_attribute_timestamp'),
+        ),
+    ]
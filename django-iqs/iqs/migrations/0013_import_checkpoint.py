@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-17 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0012_typed_values'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.BigIntegerField()),
+                ('mtime', models.FloatField()),
+                ('checksum', models.CharField(blank=True, default='', max_length=64)),
+                ('path', models.CharField(max_length=1024)),
+                ('layer', models.CharField(blank=True, default='', max_length=1024)),
+                ('attribute', models.CharField(blank=True, default='', max_length=1024)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='geolayer',
+            name='staging',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='geolayer',
+            name='name',
+            field=models.CharField(max_length=1024),
+        ),
+        migrations.AddConstraint(
+            model_name='geolayer',
+            constraint=models.UniqueConstraint(condition=models.Q(('staging', False)), fields=('name',), name='iqs_geolayer_unique_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='geolayer',
+            constraint=models.UniqueConstraint(condition=models.Q(('staging', True)), fields=('name',), name='iqs_geolayer_unique_staging_name'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='importcheckpoint',
+            unique_together={('path', 'layer', 'attribute')},
+        ),
+    ]
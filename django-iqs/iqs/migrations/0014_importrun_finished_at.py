@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 17:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0013_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importrun',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+    ]
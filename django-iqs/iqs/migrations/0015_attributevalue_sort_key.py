@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+def fill_sort_keys(apps, schema_editor):
+    """Copy the first characters of the texts to the sort keys of the values"""
+    AttributeValue = apps.get_model("iqs", "AttributeValue")
+    if not AttributeValue.objects.exists():
+        return
+    schema_editor.execute("""
+        UPDATE iqs_attributevalue attribute_value
+        SET sort_key = left(value_text.text, %s)
+        FROM iqs_valuetext value_text
+        WHERE value_text.id = attribute_value.content_id
+    """, [32])
+
+
+class Migration(migrations.Migration):
+    # The index is built once the keys are filled and committed
+    atomic = False
+
+    dependencies = [
+        ('iqs', '0014_importrun_finished_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attributevalue',
+            name='sort_key',
+            field=models.CharField(blank=True, db_collation='C', default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(fill_sort_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='attributevalue',
+            index=models.Index(fields=['attribute', 'sort_key'], name='iqs_value_attribute_sort_key'),
+        ),
+    ]
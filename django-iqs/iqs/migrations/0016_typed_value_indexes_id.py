@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0015_attributevalue_sort_key'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='attributevalue',
+            name='iqs_value_attribute_number',
+        ),
+        migrations.RemoveIndex(
+            model_name='attributevalue',
+            name='iqs_value_attribute_timestamp',
+        ),
+        migrations.AddIndex(
+            model_name='attributevalue',
+            index=models.Index(condition=models.Q(('number__isnull', False)), fields=['attribute', 'number', 'id'], name='iqs_value_attribute_number'),
+        ),
+        migrations.AddIndex(
+            model_name='attributevalue',
+            index=models.Index(condition=models.Q(('timestamp__isnull', False)), fields=['attribute', 'timestamp', 'id'], name='iqs_value_attribute_timestamp'),
+        ),
+    ]
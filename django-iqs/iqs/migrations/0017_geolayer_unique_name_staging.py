@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iqs', '0016_typed_value_indexes_id'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='geolayer',
+            name='iqs_geolayer_unique_name',
+        ),
+        migrations.RemoveConstraint(
+            model_name='geolayer',
+            name='iqs_geolayer_unique_staging_name',
+        ),
+        migrations.AddConstraint(
+            model_name='geolayer',
+            constraint=models.UniqueConstraint(fields=('name', 'staging'), name='iqs_geolayer_unique_name_staging'),
+        ),
+    ]
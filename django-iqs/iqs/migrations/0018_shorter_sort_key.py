@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-17 19:10
+
+from django.db import migrations, models
+
+
+def shorten_sort_keys(apps, schema_editor):
+    """Cut the sort keys to their new length, which the column type does not do"""
+    schema_editor.execute("""
+        UPDATE iqs_attributevalue
+        SET sort_key = left(sort_key, %s)
+        WHERE length(sort_key) > %s
+    """, [16, 16])
+
+
+class Migration(migrations.Migration):
+    # The column is altered once the shortened keys are committed
+    atomic = False
+
+    dependencies = [
+        ('iqs', '0017_geolayer_unique_name_staging'),
+    ]
+
+    operations = [
+        migrations.RunPython(shorten_sort_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='attributevalue',
+            name='sort_key',
+            field=models.CharField(blank=True, db_collation='C', default='', editable=False, max_length=16),
+        ),
+    ]
@@ -1,6 +1,11 @@
 import datetime
+import hashlib
+import uuid
 
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.gis.db import models
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Collate
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
@@ -49,12 +54,169 @@ class GeometryType(models.Model):
         return self.name
 
 
+class FingerprintedModel(models.Model):
+    """Fingerprint of a data file (see fingerprints.py)"""
+
+    size = models.BigIntegerField()
+    mtime = models.FloatField()
+    checksum = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+    )
+
+    class Meta:
+        abstract = True
+
+    def matches(self, fingerprint):
+        """Tell if the file is unchanged since its fingerprint was taken"""
+        if self.checksum and fingerprint.checksum:
+            return self.checksum == fingerprint.checksum
+        return self.size == fingerprint.size and self.mtime == fingerprint.mtime
+
+
+class SourceFile(FingerprintedModel):
+    """Data file the geolayers were imported from, with its fingerprint"""
+
+    path = models.CharField(
+        max_length=1024,
+        unique=True,
+        null=False,
+    )
+    imported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.path
+
+
+class ImportCheckpoint(FingerprintedModel):
+    """
+    Progress of load_data on a data file, left behind if it is interrupted:
+    a row for the file itself (no layer), and for each attribute of the
+    layers written to a staging copy, the number of its values committed.
+    """
+
+    path = models.CharField(
+        max_length=1024,
+        null=False,
+    )
+    layer = models.CharField(
+        max_length=1024,
+        blank=True,
+        default="",
+    )
+    attribute = models.CharField(
+        max_length=1024,
+        blank=True,
+        default="",
+    )
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("path", "layer", "attribute")
+
+    def __str__(self):
+        return f"{self.path} {self.layer} {self.attribute}: {self.offset}"
+
+
+class ImportRun(models.Model):
+    """
+    Run of an import command: the catalogue only changes with them. A run
+    is recorded before the first change of the command, and finished after
+    its last one.
+    """
+
+    command = models.CharField(
+        max_length=64,
+        null=False,
+    )
+    started_at = models.DateTimeField()
+    # Unset while the command runs, and if it failed
+    finished_at = models.DateTimeField(
+        default=timezone.now,
+        null=True,
+        blank=True,
+    )
+
+    @classmethod
+    def start(cls, command):
+        """Record the start of a run of an import command"""
+        return cls.objects.create(command=command, started_at=timezone.now(), finished_at=None)
+
+    def finish(self):
+        """Record the end of the run, once all its changes are committed"""
+        self.finished_at = timezone.now()
+        self.save(update_fields=["finished_at"])
+
+    @classmethod
+    def unfinished(cls):
+        """
+        Return the runs which are not finished: running, or failed and not
+        followed by a finished run of the same command
+        """
+        finished_later = cls.objects.filter(
+            command=OuterRef("command"), pk__gt=OuterRef("pk"), finished_at__isnull=False
+        )
+        return cls.objects.filter(finished_at=None).exclude(Exists(finished_later))
+
+    @classmethod
+    def latest(cls):
+        """Return the runs, latest first, with `running` set while any run is unfinished"""
+        return cls.objects.annotate(running=Exists(cls.unfinished())).order_by("-pk")
+
+    @classmethod
+    def last(cls):
+        """Return the last import run, finished or not, or None before the first import"""
+        return cls.latest().first()
+
+    def __str__(self):
+        if self.finished_at is None:
+            return f"{self.command} started {self.started_at:%Y-%m-%d %H:%M:%S}"
+        return f"{self.command} {self.finished_at:%Y-%m-%d %H:%M:%S}"
+
+
+class MetadataMismatch(models.Model):
+    """Data file or metadata entry without a counterpart, found by load_metadata"""
+
+    NOT_IN_METADATA = "not_in_metadata"
+    NOT_ON_DISK = "not_on_disk"
+
+    kind = models.CharField(
+        max_length=32,
+        choices=[
+            (NOT_IN_METADATA, _("File not described in the metadata")),
+            (NOT_ON_DISK, _("Metadata entry without a file")),
+        ],
+    )
+    filename = models.CharField(max_length=1024)
+    path = models.CharField(
+        max_length=1024,
+        blank=True,
+        default="",
+    )
+    detected_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = _("Metadata mismatch")
+        verbose_name_plural = _("Metadata mismatches")
+
+    def __str__(self):
+        return f"{self.filename}: {self.get_kind_display()}"
+
+
+class LiveGeoLayerManager(models.Manager):
+    """Geolayers of the catalogue, without the staging copies being imported"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(staging=False)
+
+
 class GeoLayer(models.Model):
     """Geographic layers"""
 
     name = models.CharField(
         max_length=1024,
-        unique=True,
         null=False,
     )
     geom = models.ForeignKey(
@@ -62,6 +224,38 @@ class GeoLayer(models.Model):
         on_delete=models.CASCADE,
     )
     epsg_code = models.IntegerField(default=4326)
+    source = models.ForeignKey(
+        SourceFile,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="geolayers",
+    )
+    # Bounding box of the layer reprojected to WGS 84, GiST-indexed
+    extent = models.PolygonField(
+        srid=4326,
+        null=True,
+        blank=True,
+    )
+    # Set when the extent changed since the relations were last computed
+    relations_dirty = models.BooleanField(default=True)
+    # Row of the metadata database describing the source file, set by load_metadata
+    metadata = models.JSONField(default=dict, blank=True)
+    # Copy of a layer written by chunks by load_data, swapped into the layer
+    # of the same name once complete: hidden from the catalogue until then
+    staging = models.BooleanField(default=False)
+
+    objects = models.Manager()
+    live = LiveGeoLayerManager()
+
+    class Meta:
+        constraints = [
+            # A layer and its staging copy at most
+            models.UniqueConstraint(fields=["name", "staging"], name="iqs_geolayer_unique_name_staging"),
+        ]
+        indexes = [
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"], name="iqs_geolayer_name_trgm"),
+        ]
 
     def __str__(self):
         return self.name
@@ -119,25 +313,102 @@ class Attribute(models.Model):
     #class Meta:
     #    unique_together = ("geolayer", "priority_level")
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"], name="iqs_attribute_name_trgm"),
+        ]
+
     def __str__(self):
         return self.name
 
 
-class AttributeValue(models.Model):
-    """Attribute values for a given attribute of a geolayer"""
+class AttributeStatistics(models.Model):
+    """Profile of the values of an attribute, computed at import"""
+
+    attribute = models.OneToOneField(
+        Attribute,
+        on_delete=models.CASCADE,
+        related_name="statistics",
+    )
+    row_count = models.BigIntegerField()
+    null_count = models.BigIntegerField()
+    distinct_count = models.BigIntegerField()
+    # Set when the distinct values were capped at import: the distinct count
+    # is then a lower bound and the other statistics approximations
+    distinct_truncated = models.BooleanField(default=False)
+    # Most frequent values, as [value, count] pairs
+    top_values = models.JSONField(default=list)
+    min_value = models.FloatField(null=True, blank=True)
+    max_value = models.FloatField(null=True, blank=True)
+    mean_value = models.FloatField(null=True, blank=True)
+    min_length = models.IntegerField(null=True, blank=True)
+    max_length = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Attribute statistics")
+        verbose_name_plural = _("Attribute statistics")
+
+    def __str__(self):
+        return f"Statistics of {self.attribute}"
+
 
-    content = models.CharField(
+class ValueText(models.Model):
+    """Distinct text of the attribute values, shared by all the attributes"""
+
+    # MD5 of the text, as md5(text)::uuid in PostgreSQL: a fixed size key
+    hash = models.UUIDField(
+        unique=True,
+    )
+    text = models.CharField(
         max_length=1024,
-        unique=False,
         null=False,
     )
-    geolayer = models.ForeignKey(
-        GeoLayer,
-        on_delete=models.CASCADE,
+
+    class Meta:
+        indexes = [
+            # Prefix filtering and ordering of the values in bytewise order
+            models.Index(Collate("text", "C"), name="iqs_valuetext_text"),
+            # Similarity and substring search
+            GinIndex(fields=["text"], opclasses=["gin_trgm_ops"], name="iqs_valuetext_text_trgm"),
+        ]
+
+    @staticmethod
+    def hash_text(text):
+        """Return the hash of a text"""
+        return uuid.UUID(hashlib.md5(text.encode()).hexdigest())
+
+    def __str__(self):
+        return self.text
+
+
+class AttributeValue(models.Model):
+    """Attribute values for a given attribute of a geolayer"""
+
+    # Number of leading characters of the text kept in the sort key
+    SORT_KEY_LENGTH = 16
+
+    # Texts are stored once in the ValueText dictionary, however many
+    # attributes have them (e.g. "0", "None" or the names of the communes)
+    content = models.ForeignKey(
+        ValueText,
+        on_delete=models.PROTECT,
+        related_name="attribute_values",
     )
     attribute = models.ForeignKey(
         Attribute,
         on_delete=models.CASCADE,
+        # Served by the unique index, which starts with the attribute
+        db_index=False,
+    )
+    # First characters of the text, in bytewise order: the values of an
+    # attribute are paged in the order of their text through the index on
+    # (attribute, sort_key), without sorting them all through the dictionary
+    sort_key = models.CharField(
+        max_length=SORT_KEY_LENGTH,
+        db_collation="C",
+        blank=True,
+        default="",
+        editable=False,
     )
     priority_level = models.ForeignKey(
         AttributePriorityLevel,
@@ -145,12 +416,64 @@ class AttributeValue(models.Model):
         null=True,
         blank=True,
     )
+    # Typed copy of the content, for the attributes of numeric, date and
+    # boolean types (see typed_values.py): range queries and sorting
+    number = models.FloatField(
+        null=True,
+        blank=True,
+    )
+    timestamp = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+    boolean = models.BooleanField(
+        null=True,
+        blank=True,
+    )
 
     class Meta:
-        unique_together = ("content", "geolayer", "attribute")
+        unique_together = ("attribute", "content")
+        indexes = [
+            models.Index(fields=["attribute", "sort_key"], name="iqs_value_attribute_sort_key"),
+            # Range scans over the typed values of an attribute, in order,
+            # the id telling apart the values typed the same (see pagination.py).
+            # A boolean attribute has a handful of values at most: none is needed.
+            models.Index(
+                fields=["attribute", "number", "id"],
+                condition=Q(number__isnull=False),
+                name="iqs_value_attribute_number",
+            ),
+            models.Index(
+                fields=["attribute", "timestamp", "id"],
+                condition=Q(timestamp__isnull=False),
+                name="iqs_value_attribute_timestamp",
+            ),
+        ]
+
+    @classmethod
+    def text_sort_key(cls, text):
+        """Return the sort key of the values of a text"""
+        return text[: cls.SORT_KEY_LENGTH]
+
+    def save(self, *args, **kwargs):
+        # load_data writes the values in bulk, with their sort key
+        self.sort_key = self.text_sort_key(self.content.text)
+        super().save(*args, **kwargs)
+
+    @property
+    def geolayer(self):
+        return self.attribute.geolayer
+
+    @property
+    def typed_value(self):
+        """Number, timestamp or boolean of the value, or None"""
+        for value in (self.number, self.timestamp, self.boolean):
+            if value is not None:
+                return value
+        return None
 
     def __str__(self):
-        return self.content
+        return self.content.text
 
 
 class OgcRelationType(models.Model):
@@ -177,3 +500,31 @@ class OgcRelationType(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class LayerRelation(models.Model):
+    """Spatial relation between the extents of two geolayers"""
+
+    geolayer = models.ForeignKey(
+        GeoLayer,
+        on_delete=models.CASCADE,
+        related_name="relations",
+    )
+    other = models.ForeignKey(
+        GeoLayer,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    # The most specific relation holding; disjoint layers have no row
+    relation = models.ForeignKey(
+        OgcRelationType,
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        unique_together = ("geolayer", "other")
+        verbose_name = _("Layer relation")
+        verbose_name_plural = _("Layer relations")
+
+    def __str__(self):
+        return f"{self.geolayer} {self.relation} {self.other}"
@@ -0,0 +1,152 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.functions import Collate
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+from .models import AttributeValue
+from .typed_values import format_typed, parse_typed, typed_field
+
+# Greatest code point: every string starting with a prefix sorts before
+# the prefix followed by it, in bytewise order
+MAX_CHAR = "\U0010ffff"
+
+
+def attribute_values_page(attribute, after=None, prefix="", size=100):
+    """
+    Return a page of the values of an attribute, and whether there is a next one.
+
+    Values are sorted bytewise (collation "C") and the page starts after the
+    value `after`. They are ordered on their sort key, the first characters
+    of their text, then on their text: each page is a range scan of the
+    index on (attribute, sort_key), whatever its position, and only the
+    values sharing the sort key of the last one are sorted on their text.
+    Only the values starting with `prefix` are kept.
+    """
+    queryset = AttributeValue.objects.filter(attribute=attribute).select_related("content").alias(
+        text=Collate("content__text", "C"),
+    )
+    if prefix:
+        key = AttributeValue.text_sort_key(prefix)
+        queryset = queryset.filter(sort_key__gte=key, sort_key__lt=key + MAX_CHAR)
+        if prefix != key:
+            queryset = queryset.filter(text__gte=prefix, text__lt=prefix + MAX_CHAR)
+    if after is not None:
+        key = AttributeValue.text_sort_key(after)
+        queryset = queryset.filter(sort_key__gte=key).exclude(sort_key=key, text__lte=after)
+
+    values = list(queryset.order_by("sort_key", "text")[: size + 1])
+    return values[:size], len(values) > size
+
+
+def typed_values_page(attribute, field, after=None, after_pk=None, minimum=None, maximum=None, size=100):
+    """
+    Return a page of the typed values of an attribute in the order of their
+    `field` (number, timestamp or boolean) then of their id, and whether
+    there is a next one.
+
+    Only the values between `minimum` and `maximum` (included) are kept and
+    the page starts after the typed value `after` and the id `after_pk`:
+    with the partial index on (attribute, field, id), each page is an index
+    range scan. Distinct texts may have the same typed value (e.g. "1" and
+    "01", or integers beyond 2**53 stored as floats), hence the id. The
+    values which are not of the type (e.g. "None") are left out.
+    """
+    queryset = AttributeValue.objects.filter(attribute=attribute, **{f"{field}__isnull": False})
+    if minimum is not None:
+        queryset = queryset.filter(**{f"{field}__gte": minimum})
+    if maximum is not None:
+        queryset = queryset.filter(**{f"{field}__lte": maximum})
+    if after is not None and after_pk is not None:
+        queryset = queryset.filter(**{f"{field}__gte": after}).exclude(**{field: after, "pk__lte": after_pk})
+    elif after is not None:
+        queryset = queryset.filter(**{f"{field}__gt": after})
+
+    values = list(queryset.select_related("content").order_by(field, "pk")[: size + 1])
+    return values[:size], len(values) > size
+
+
+def parse_typed_cursor(field, cursor):
+    """
+    Return the typed value and the id of a ?after= cursor of typed values,
+    "<value>,<id>" or only "<value>". Raises ValueError if it is invalid.
+    """
+    value, separator, pk = cursor.rpartition(",")
+    if not separator:
+        return parse_typed(field, cursor), None
+    return parse_typed(field, value), int(pk)
+
+
+def attribute_values_listing(attribute, params, size=100):
+    """
+    Return a page of the values of an attribute for the query parameters
+    `params`, and the ?after= value of the next page or None.
+
+    Values are listed in the bytewise order of their text, only those
+    starting with ?q=, or with ?order=value or a range (?min=, ?max=) in
+    the order of their typed value, then paged by the typed value and id of
+    the last one. Raises ValueError if the attribute has no typed values or
+    a parameter is not a value of its type.
+    """
+    if params.get("order") != "value" and not (params.get("min") or params.get("max")):
+        values, has_next = attribute_values_page(
+            attribute,
+            after=params.get("after"),
+            prefix=params.get("q", ""),
+            size=size,
+        )
+        return values, values[-1].content.text if has_next else None
+
+    field = typed_field(attribute.type.name)
+    if field is None:
+        raise ValueError(f"The values of type {attribute.type.name} have no typed order")
+    arguments = {
+        name: parse_typed(field, params[param])
+        for param, name in (("min", "minimum"), ("max", "maximum"))
+        if params.get(param)
+    }
+    if params.get("after"):
+        arguments["after"], arguments["after_pk"] = parse_typed_cursor(field, params["after"])
+    values, has_next = typed_values_page(attribute, field, size=size, **arguments)
+    if not has_next:
+        return values, None
+    return values, f"{format_typed(getattr(values[-1], field))},{values[-1].pk}"
+
+
+class IdCursorPagination(CursorPagination):
+    """Cursor pagination of the API lists, in primary key order"""
+
+    ordering = "pk"
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+
+
+def estimated_count(model, using="default"):
+    """Row count of a model's table estimated by PostgreSQL statistics, -1 if unknown"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row else -1
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator which does not count the rows of large unfiltered querysets
+    but reads the estimate of the planner statistics (pg_class.reltuples).
+    """
+
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_count(queryset.model, using=queryset.db)
+            if estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
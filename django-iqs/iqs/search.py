@@ -0,0 +1,45 @@
+import re
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Q
+
+from .models import Attribute, AttributeValue, GeoLayer
+
+# Shorter queries have no trigram and could not use the indexes
+MIN_QUERY_LENGTH = 3
+
+
+def search_catalogue(query, limit=50):
+    """
+    Search the geolayers, attributes and values similar to or containing `query`.
+
+    Both conditions are served by the pg_trgm GIN indexes: the substring
+    match is a case-insensitive regex (~*) as the UPPER() of icontains would
+    not use them. Hits are ranked by trigram similarity and come with their
+    geolayer and attribute.
+    """
+    query = query.strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return {"geolayers": [], "attributes": [], "values": []}
+    pattern = re.escape(query)
+
+    def ranked(queryset, field):
+        return (
+            queryset.filter(Q(**{f"{field}__trigram_similar": query}) | Q(**{f"{field}__iregex": pattern}))
+            .annotate(similarity=TrigramSimilarity(field, query))
+            .order_by("-similarity", "pk")[:limit]
+        )
+
+    return {
+        "geolayers": list(ranked(GeoLayer.live.select_related("geom"), "name")),
+        # Without the staging copies of the layers being imported
+        "attributes": list(
+            ranked(Attribute.objects.filter(geolayer__staging=False).select_related("geolayer", "type"), "name")
+        ),
+        # Matched on the dictionary of the texts, each stored once
+        "values": list(ranked(
+            AttributeValue.objects.filter(attribute__geolayer__staging=False)
+            .select_related("content", "attribute__geolayer"),
+            "content__text",
+        )),
+    }
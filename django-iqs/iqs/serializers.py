@@ -0,0 +1,81 @@
+from rest_framework import serializers
+
+from .models import Attribute, AttributeValue, GeoLayer, LayerRelation
+
+
+# Flat, read-only serializers: related names are read from the
+# select_related() of the API querysets instead of nested serializers
+
+
+class GeoLayerSerializer(serializers.ModelSerializer):
+    geometry_type = serializers.CharField(source="geom.name", read_only=True)
+    extent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GeoLayer
+        fields = ["id", "name", "geometry_type", "epsg_code", "extent"]
+        read_only_fields = fields
+
+    def get_extent(self, obj) -> list[float] | None:
+        """Bounding box of the layer in WGS 84, as [minx, miny, maxx, maxy]"""
+        return list(obj.extent.extent) if obj.extent else None
+
+
+class AttributeSerializer(serializers.ModelSerializer):
+    geolayer_name = serializers.CharField(source="geolayer.name", read_only=True)
+    type = serializers.CharField(source="type.name", read_only=True)
+
+    class Meta:
+        model = Attribute
+        fields = ["id", "name", "type", "geolayer", "geolayer_name"]
+        read_only_fields = fields
+
+
+class AttributeValueSerializer(serializers.ModelSerializer):
+    content = serializers.CharField(source="content.text", read_only=True)
+    # Number, timestamp or boolean, for the attributes of these types
+    value = serializers.ReadOnlyField(source="typed_value")
+
+    class Meta:
+        model = AttributeValue
+        fields = ["id", "content", "value", "attribute"]
+        read_only_fields = fields
+
+
+class LayerRelationSerializer(serializers.ModelSerializer):
+    relation = serializers.CharField(source="relation.name", read_only=True)
+    other_name = serializers.CharField(source="other.name", read_only=True)
+
+    class Meta:
+        model = LayerRelation
+        fields = ["relation", "other", "other_name"]
+        read_only_fields = fields
+
+
+class SearchValueSerializer(serializers.ModelSerializer):
+    content = serializers.CharField(source="content.text", read_only=True)
+    attribute_name = serializers.CharField(source="attribute.name", read_only=True)
+    geolayer = serializers.IntegerField(source="attribute.geolayer_id", read_only=True)
+    geolayer_name = serializers.CharField(source="attribute.geolayer.name", read_only=True)
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = AttributeValue
+        fields = ["id", "content", "similarity", "attribute", "attribute_name", "geolayer", "geolayer_name"]
+        read_only_fields = fields
+
+
+class SearchGeoLayerSerializer(GeoLayerSerializer):
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(GeoLayerSerializer.Meta):
+        fields = GeoLayerSerializer.Meta.fields + ["similarity"]
+        read_only_fields = fields
+
+
+class SearchAttributeSerializer(AttributeSerializer):
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(AttributeSerializer.Meta):
+        fields = AttributeSerializer.Meta.fields + ["similarity"]
+        read_only_fields = fields
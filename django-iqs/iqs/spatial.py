@@ -0,0 +1,35 @@
+import math
+
+from django.contrib.gis.geos import Polygon
+
+# SRID of the layer extents, whatever the CRS of the layers
+EXTENT_SRID = 4326
+
+
+def extent_polygon(bounds):
+    """Return the polygon of (minx, miny, maxx, maxy) bounds in WGS 84, or None"""
+    if bounds is None:
+        return None
+    polygon = Polygon.from_bbox(bounds)
+    polygon.srid = EXTENT_SRID
+    return polygon
+
+
+def parse_bbox(value):
+    """
+    Parse a 'minx,miny,maxx,maxy' bounding box in WGS 84, as given in the
+    ?bbox= query parameter. Raises ValueError if it is malformed.
+    """
+    try:
+        minx, miny, maxx, maxy = (float(coordinate) for coordinate in value.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid bbox {value!r}, expected minx,miny,maxx,maxy") from None
+    if not all(map(math.isfinite, (minx, miny, maxx, maxy))) or minx > maxx or miny > maxy:
+        raise ValueError(f"Invalid bbox {value!r}, expected minx,miny,maxx,maxy")
+    return extent_polygon((minx, miny, maxx, maxy))
+
+
+def filter_bbox(queryset, value):
+    """Restrict a GeoLayer queryset to the layers whose extent overlaps the bbox `value`"""
+    # && on the GiST index of the extents
+    return queryset.filter(extent__bboverlaps=parse_bbox(value))
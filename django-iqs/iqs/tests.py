@@ -1,9 +1,1071 @@
 # Create your tests here.
+import contextlib
 import datetime
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-from django.test import TestCase
+import fiona
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
-from .models import GeoLayer, Attribute
+from .charset import EncodingCache, check_encoding, detect_encoding, normalize_encoding, probe_dbf
+from .fingerprints import Fingerprint, file_fingerprint
+from .instrumentation import Instrumentation
+from .lookups import ImportCache
+from .management.commands.load_data import (
+    fiona_geometry_type,
+    get_unique_values,
+    profile_values,
+    prune_value_texts,
+    scan_file,
+    scan_files,
+    sync_geolayer,
+    write_attribute_values,
+    write_staged_geolayer,
+)
+from .manifest import FileManifest
+from .models import (
+    GeoLayer,
+    Attribute,
+    AttributeStatistics,
+    AttributeType,
+    AttributeValue,
+    GeometryType,
+    ImportCheckpoint,
+    ImportRun,
+    LayerRelation,
+    MetadataMismatch,
+    OgcRelationType,
+    SourceFile,
+    ValueText,
+)
+from .pagination import EstimatedCountPaginator, attribute_values_listing, attribute_values_page
+from .spatial import extent_polygon
 
+
+def create_values(attribute, contents):
+    """Create the values of an attribute, and their texts"""
+    texts = ValueText.objects.bulk_create(
+        ValueText(hash=ValueText.hash_text(content), text=content) for content in contents
+    )
+    return AttributeValue.objects.bulk_create(
+        AttributeValue(attribute=attribute, content=text, sort_key=AttributeValue.text_sort_key(text.text))
+        for text in texts
+    )
+
+
+def write_dbf(filepath, values, encoding, language_driver=0, width=40):
+    """Write a DBF file with a single text field holding `values`"""
+    header = bytearray(32)
+    header[0] = 0x03
+    header[4:8] = len(values).to_bytes(4, "little")
+    header[8:10] = (32 + 32 + 1).to_bytes(2, "little")
+    header[10:12] = (1 + width).to_bytes(2, "little")
+    header[29] = language_driver
+    field = bytearray(32)
+    field[:4] = b"name"
+    field[11] = ord("C")
+    field[16] = width
+    # Longer values are cut to the width of the field, as some writers do
+    records = b"".join(b" " + value.encode(encoding).ljust(width)[:width] for value in values)
+    Path(filepath).write_bytes(bytes(header) + bytes(field) + b"\r" + records + b"\x1a")
+
+
+class CatalogueQueryBudgetTests(TestCase):
+    """The catalogue pages run a fixed number of queries, whatever the number of attributes, and are then cached"""
+
+    @classmethod
+    def setUpTestData(cls):
+        geometry = GeometryType.objects.create(name="Point")
+        cls.geolayer = GeoLayer.objects.create(name="layer", geom=geometry, epsg_code=2056)
+        types = [AttributeType.objects.create(name=name) for name in ("TEXT", "INTEGER", "DATE")]
+        cls.attributes = [
+            Attribute.objects.create(name=f"attr_{i}", geolayer=cls.geolayer, type=types[i % len(types)])
+            for i in range(30)
+        ]
+
+    def setUp(self):
+        # The pages are cached by import generation, which the tests share
+        cache.clear()
+
+    def test_geolayer_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("iqs:geolayers"))
+        self.assertContains(response, "layer")
+
+    def test_geolayer_detail(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("iqs:geolayer_detail", args=[self.geolayer.pk]))
+        self.assertContains(response, "attr_29")
+        self.assertContains(response, "DATE")
+
+    def test_attribute_list(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("iqs:attributes", args=[self.geolayer.pk]))
+        self.assertContains(response, "attr_29")
+
+    def test_cached_until_import(self):
+        url = reverse("iqs:geolayer_detail", args=[self.geolayer.pk])
+        self.client.get(url)
+        Attribute.objects.filter(name="attr_29").update(name="renamed")
+        # Only the import generation is read
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, "attr_29")
+
+        ImportRun.objects.create(command="load_data", started_at=timezone.now())
+        response = self.client.get(url)
+        self.assertContains(response, "renamed")
+        self.assertNotContains(response, "attr_29")
+
+    def test_not_cached_during_import(self):
+        url = reverse("iqs:geolayer_detail", args=[self.geolayer.pk])
+        run = ImportRun.start("load_data")
+        self.client.get(url)
+        # Committed by the running import
+        Attribute.objects.filter(name="attr_29").update(name="renamed")
+        self.assertContains(self.client.get(url), "renamed")
+
+        run.finish()
+        self.client.get(url)
+        Attribute.objects.filter(name="renamed").update(name="again")
+        self.assertContains(self.client.get(url), "renamed")
+
+    def test_not_cached_during_any_import(self):
+        url = reverse("iqs:geolayer_detail", args=[self.geolayer.pk])
+        ImportRun.start("load_data")
+        # Finished while load_data still runs, or failed
+        ImportRun.start("compute_relations").finish()
+        self.client.get(url)
+        Attribute.objects.filter(name="attr_29").update(name="renamed")
+        self.assertContains(self.client.get(url), "renamed")
+
+        # Until a run of load_data finishes
+        ImportRun.start("load_data").finish()
+        self.client.get(url)
+        Attribute.objects.filter(name="renamed").update(name="again")
+        self.assertContains(self.client.get(url), "renamed")
+
+    def test_attribute_detail(self):
+        attribute = self.attributes[-1]
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("iqs:attribute_detail", args=[self.geolayer.pk, attribute.pk])
+            )
+        self.assertContains(response, "attr_29")
+        self.assertContains(response, str(attribute.type))
+
+    async def test_async_client(self):
+        # Served as under an ASGI server
+        response = await self.async_client.get(reverse("iqs:geolayer_detail", args=[self.geolayer.pk]))
+        self.assertContains(response, "attr_29")
+        response = await self.async_client.get(reverse("iqs:geolayers"), {"bbox": "1,2,3"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AttributeStatisticsTests(TestCase):
+    def test_profile_numbers(self):
+        statistics = profile_values({1: 3, 4: 1, None: 2}, rows=6)
+        self.assertEqual(statistics["null_count"], 2)
+        self.assertEqual(statistics["distinct_count"], 3)
+        self.assertEqual(statistics["top_values"][0], ["1", 3])
+        self.assertEqual((statistics["min_value"], statistics["max_value"]), (1.0, 4.0))
+        self.assertEqual(statistics["mean_value"], 7 / 4)
+        self.assertIsNone(statistics["min_length"])
+
+    def test_profile_strings(self):
+        statistics = profile_values({"ab": 1, "abcd": 2, float("nan"): 1}, rows=4, max_distinct=3)
+        self.assertEqual(statistics["null_count"], 1)
+        self.assertTrue(statistics["distinct_truncated"])
+        self.assertEqual((statistics["min_length"], statistics["max_length"]), (2, 4))
+        self.assertIsNone(statistics["mean_value"])
+
+    def test_attribute_detail(self):
+        geolayer = GeoLayer.objects.create(
+            name="layer", geom=GeometryType.objects.create(name="Point"), epsg_code=2056
+        )
+        attribute = Attribute.objects.create(
+            name="commune", geolayer=geolayer, type=AttributeType.objects.create(name="TEXT")
+        )
+        AttributeStatistics.objects.create(
+            attribute=attribute,
+            **profile_values({"Lausanne": 5, "Genève": 2}, rows=7),
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("iqs:attribute_detail", args=[geolayer.pk, attribute.pk]))
+        self.assertContains(response, "Distinct values: 2")
+        self.assertContains(response, "Lausanne (5)")
+
+
+class AttributeValueViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        geometry = GeometryType.objects.create(name="Point")
+        geolayer = GeoLayer.objects.create(name="layer", geom=geometry, epsg_code=2056)
+        cls.attribute = Attribute.objects.create(
+            name="commune",
+            geolayer=geolayer,
+            type=AttributeType.objects.create(name="TEXT"),
+        )
+        create_values(cls.attribute, [f"value {i:03}" for i in range(150)])
+        cls.url = reverse("iqs:attribute_values", args=[geolayer.pk, cls.attribute.pk])
+
+    def test_first_page(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        values = [value.content.text for value in response.context["values"]]
+        self.assertEqual(values, [f"value {i:03}" for i in range(100)])
+        self.assertEqual(response.context["next_after"], "value 099")
+
+    def test_next_page(self):
+        response = self.client.get(self.url, {"after": "value 099"})
+        values = [value.content.text for value in response.context["values"]]
+        self.assertEqual(values, [f"value {i:03}" for i in range(100, 150)])
+        self.assertIsNone(response.context["next_after"])
+
+    def test_prefix(self):
+        response = self.client.get(self.url, {"q": "value 12"})
+        values = [value.content.text for value in response.context["values"]]
+        self.assertEqual(values, [f"value {i:03}" for i in range(120, 130)])
+
+    def test_longer_than_sort_key(self):
+        attribute = Attribute.objects.create(
+            name="adresse", geolayer=self.attribute.geolayer, type=self.attribute.type
+        )
+        street = "Avenue de la Gare 12, 1003 Lausanne, appartement "
+        create_values(attribute, ["B"] + [f"{street}{i}" for i in (3, 1, 2)])
+        self.assertEqual(
+            AttributeValue.objects.get(attribute=attribute, content__text=f"{street}1").sort_key,
+            street[: AttributeValue.SORT_KEY_LENGTH],
+        )
+
+        # Ordered on the whole text, not only on the sort key
+        values, has_next = attribute_values_page(attribute, size=2)
+        self.assertEqual([value.content.text for value in values], [f"{street}1", f"{street}2"])
+        self.assertTrue(has_next)
+        values, has_next = attribute_values_page(attribute, after=f"{street}2", size=2)
+        self.assertEqual([value.content.text for value in values], [f"{street}3", "B"])
+        self.assertFalse(has_next)
+        values, _ = attribute_values_page(attribute, prefix=f"{street}2")
+        self.assertEqual([value.content.text for value in values], [f"{street}2"])
+
+
+class ValueTextTests(TestCase):
+    def test_texts_shared_by_attributes(self):
+        geometry = GeometryType.objects.create(name="Point")
+        text = AttributeType.objects.create(name="TEXT")
+        attributes = [
+            Attribute.objects.create(
+                name="commune",
+                geolayer=GeoLayer.objects.create(name=name, geom=geometry, epsg_code=2056),
+                type=text,
+            )
+            for name in ("layer_a", "layer_b")
+        ]
+        cache = ImportCache()
+        write_attribute_values(attributes[0], ["Lausanne", "Genève", 0], cache, writer="bulk")
+        # Looked up by hash, once the import cache is gone
+        write_attribute_values(attributes[1], ["Lausanne", "0", "Sion"], ImportCache(), writer="bulk")
+
+        self.assertEqual(ValueText.objects.count(), 4)
+        self.assertEqual(AttributeValue.objects.count(), 6)
+        self.assertEqual(
+            sorted(str(value) for value in AttributeValue.objects.filter(attribute=attributes[1])),
+            ["0", "Lausanne", "Sion"],
+        )
+        self.assertEqual(ValueText.objects.get(text="Sion").hash, ValueText.hash_text("Sion"))
+
+        attributes[1].delete()
+        self.assertEqual(prune_value_texts(), 1)
+        self.assertFalse(ValueText.objects.filter(text="Sion").exists())
+
+
+class WriterTests(TestCase):
+    def test_copy_and_bulk(self):
+        geolayer = GeoLayer.objects.create(
+            name="layer", geom=GeometryType.objects.create(name="Point"), epsg_code=2056
+        )
+        integer = AttributeType.objects.create(name="INTEGER")
+        attributes = {
+            writer: Attribute.objects.create(name=writer, geolayer=geolayer, type=integer)
+            for writer in ("copy", "bulk")
+        }
+        for writer, attribute in attributes.items():
+            rows = write_attribute_values(
+                attribute, [12, "12", "7", "None"], ImportCache(), attr_type="INTEGER", writer=writer
+            )
+            # 12 and "12" have the same content
+            self.assertEqual(rows, 3)
+
+        def values(writer):
+            return sorted(
+                AttributeValue.objects.filter(attribute=attributes[writer]).values_list("content__text", "number")
+            )
+
+        self.assertEqual(values("copy"), [("12", 12.0), ("7", 7.0), ("None", None)])
+        self.assertEqual(values("copy"), values("bulk"))
+        self.assertEqual(ValueText.objects.count(), 3)
+
+
+class SyncGeolayerTests(TestCase):
+    metadata = {
+        "layer_name": "communes",
+        "driver": "GPKG",
+        "crs": 2056,
+        "attributes": {"nom": "str", "numero": "str", "ancien": "str"},
+        "geometry_type": "Polygon",
+        "extent": (6.5, 46.4, 6.7, 46.6),
+    }
+
+    def setUp(self):
+        self.source = SourceFile.objects.create(path="/data/communes.gpkg", size=1000, mtime=1.0)
+        sync_geolayer(
+            self.source,
+            self.metadata,
+            {"nom": ["Lausanne", "Genève"], "numero": ["1", "2"], "ancien": ["x"]},
+            ImportCache(),
+        )
+        self.geolayer = GeoLayer.objects.get(name="communes")
+        self.attributes = {attribute.name: attribute for attribute in self.geolayer.attributes.all()}
+
+    def values_of(self, name):
+        return dict(
+            AttributeValue.objects.filter(attribute__geolayer=self.geolayer, attribute__name=name)
+            .values_list("content__text", "pk")
+        )
+
+    def test_reimport(self):
+        lausanne = self.values_of("nom")["Lausanne"]
+        metadata = {
+            **self.metadata,
+            "attributes": {"nom": "str", "numero": "int", "population": "int"},
+        }
+        values = {"nom": ["Lausanne", "Sion"], "numero": ["1", "2", "3"], "population": ["140000"]}
+        statistics = {
+            name: profile_values(dict.fromkeys(contents, 1), rows=len(contents))
+            for name, contents in values.items()
+        }
+        cache = ImportCache()
+        rows = sync_geolayer(self.source, metadata, values, cache, statistics=statistics)
+
+        # Sion, the retyped numbers written again and the new population
+        self.assertEqual(rows, 5)
+        # Genève, the retyped numbers and the values of the removed attribute
+        self.assertEqual(cache.deleted_values, 4)
+        self.assertEqual(GeoLayer.objects.get(name="communes").pk, self.geolayer.pk)
+        attributes = {attribute.name: attribute for attribute in self.geolayer.attributes.select_related("type")}
+        self.assertEqual(sorted(attributes), ["nom", "numero", "population"])
+        self.assertFalse(Attribute.objects.filter(pk=self.attributes["ancien"].pk).exists())
+        # Kept attributes and unchanged values keep their ids
+        self.assertEqual(attributes["nom"].pk, self.attributes["nom"].pk)
+        self.assertEqual(attributes["numero"].pk, self.attributes["numero"].pk)
+        self.assertEqual(self.values_of("nom"), {"Lausanne": lausanne, "Sion": mock.ANY})
+        # Retyped: the values are typed as such
+        self.assertEqual(attributes["numero"].type.name, "INTEGER")
+        self.assertEqual(
+            sorted(AttributeValue.objects.filter(attribute=attributes["numero"]).values_list("number", flat=True)),
+            [1, 2, 3],
+        )
+        self.assertEqual(AttributeStatistics.objects.filter(attribute__geolayer=self.geolayer).count(), 3)
+
+    def test_unchanged(self):
+        values = {"nom": ["Genève", "Lausanne"], "numero": ["2", "1"], "ancien": ["x"]}
+        before = {name: self.values_of(name) for name in values}
+        cache = ImportCache()
+        self.assertEqual(sync_geolayer(self.source, self.metadata, values, cache), 0)
+        self.assertEqual(cache.deleted_values, 0)
+        self.assertEqual({name: self.values_of(name) for name in values}, before)
+
+
+class TypedValueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        geolayer = GeoLayer.objects.create(
+            name="layer", geom=GeometryType.objects.create(name="Point"), epsg_code=2056
+        )
+        cls.attributes = {}
+        for name, attr_type, values in [
+            ("population", "INTEGER", ["5", "100", "150", "200", "1500", "None"]),
+            ("created", "DATE", ["2024-03-01", "2023-12-31", "NaT"]),
+            ("commune", "TEXT", ["Lausanne"]),
+        ]:
+            attribute = Attribute.objects.create(
+                name=name, geolayer=geolayer, type=AttributeType.objects.create(name=attr_type)
+            )
+            write_attribute_values(attribute, values, ImportCache(), attr_type=attr_type, writer="bulk")
+            cls.attributes[name] = attribute
+
+    def values(self, name, **params):
+        url = reverse("iqs:api-attribute-values", args=[self.attributes[name].pk])
+        return self.client.get(url, params)
+
+    def test_typed_columns(self):
+        self.assertEqual(
+            sorted(AttributeValue.objects.filter(number__isnull=False).values_list("number", flat=True)),
+            [5, 100, 150, 200, 1500],
+        )
+        value = AttributeValue.objects.get(content__text="2024-03-01")
+        self.assertEqual(value.timestamp, datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(value.typed_value, value.timestamp)
+        self.assertIsNone(AttributeValue.objects.get(content__text="NaT").typed_value)
+
+    def test_range(self):
+        response = self.values("population", min="100", max="200")
+        self.assertEqual([value["content"] for value in response.json()["results"]], ["100", "150", "200"])
+        self.assertEqual(response.json()["results"][0]["value"], 100)
+
+    def test_sorted(self):
+        response = self.values("population", order="value")
+        # Numeric, not bytewise order, without the values which are not numbers
+        self.assertEqual(
+            [value["content"] for value in response.json()["results"]],
+            ["5", "100", "150", "200", "1500"],
+        )
+        response = self.values("created", order="value", min="2024-01-01")
+        self.assertEqual([value["content"] for value in response.json()["results"]], ["2024-03-01"])
+
+    def test_equal_typed_values(self):
+        attribute = Attribute.objects.create(
+            name="identifiant", geolayer=self.attributes["population"].geolayer, type=self.attributes["population"].type
+        )
+        # Typed the same: 1 and 2**53, which is also the float of 2**53 + 1
+        contents = ["1", "01", "2", str(2**53), str(2**53 + 1)]
+        write_attribute_values(attribute, contents, ImportCache(), attr_type="INTEGER", writer="bulk")
+
+        paged, after = [], None
+        while True:
+            values, after = attribute_values_listing(attribute, {"order": "value", "after": after}, size=1)
+            paged += [value.content.text for value in values]
+            if after is None:
+                break
+        self.assertEqual(len(paged), len(contents))
+        self.assertCountEqual(paged[:2], ["1", "01"])
+        self.assertEqual(paged[2], "2")
+        self.assertCountEqual(paged[3:], [str(2**53), str(2**53 + 1)])
+
+        response = self.client.get(reverse("iqs:api-attribute-values", args=[attribute.pk]), {"order": "value"})
+        self.assertEqual(len(response.json()["results"]), len(contents))
+
+    def test_invalid(self):
+        self.assertEqual(self.values("commune", order="value").status_code, 400)
+        self.assertEqual(self.values("population", min="many").status_code, 400)
+        self.assertEqual(self.values("population", order="value", after="100,many").status_code, 400)
+
+
+class StagedImportTests(TestCase):
+    metadata = {
+        "layer_name": "communes",
+        "driver": "GPKG",
+        "crs": 2056,
+        "attributes": {"nom": "str"},
+        "geometry_type": "Polygon",
+        "extent": (6.5, 46.4, 6.7, 46.6),
+    }
+    values = {"nom": [f"commune {i}" for i in range(10)]}
+
+    def setUp(self):
+        self.fingerprint = Fingerprint(path="/data/communes.gpkg", size=1000, mtime=1.0)
+        self.source = SourceFile.objects.create(path=self.fingerprint.path, size=500, mtime=0.5)
+        self.live = GeoLayer.objects.create(
+            name="communes", geom=GeometryType.objects.create(name="Polygon"), source=self.source
+        )
+        self.attribute = Attribute.objects.create(
+            name="nom", geolayer=self.live, type=AttributeType.objects.create(name="TEXT")
+        )
+        create_values(self.attribute, ["old commune", "commune 0"])
+
+    def write(self, **kwargs):
+        return write_staged_geolayer(
+            self.source, self.fingerprint, self.metadata, self.values, ImportCache(),
+            chunk_size=3, writer="bulk", **kwargs
+        )
+
+    def values_of(self, geolayer):
+        return sorted(
+            AttributeValue.objects.filter(attribute__geolayer=geolayer).values_list("content__text", flat=True)
+        )
+
+    def test_resume(self):
+        calls = []
+
+        def interrupted(*args, **kwargs):
+            # Killed while writing the third chunk
+            calls.append(args)
+            if len(calls) == 3:
+                raise RuntimeError("interrupted")
+            return write_attribute_values(*args, **kwargs)
+
+        with mock.patch("iqs.management.commands.load_data.write_attribute_values", interrupted):
+            with self.assertRaises(RuntimeError):
+                self.write()
+
+        # Readers still see the previous layer, next to its staging copy
+        self.assertEqual(GeoLayer.live.get(name="communes"), self.live)
+        self.assertEqual(self.values_of(self.live), ["commune 0", "old commune"])
+        staged = GeoLayer.objects.get(name="communes", staging=True)
+        self.assertEqual(len(self.values_of(staged)), 6)
+        self.assertEqual(ImportCheckpoint.objects.get(layer="communes", attribute="nom").offset, 6)
+
+        kept = AttributeValue.objects.get(attribute=self.attribute, content__text="commune 0")
+        self.assertEqual(self.write(resume=True), 4)
+        # Swapped: the contents of the staging copy are now those of the layer,
+        # whose ids do not change
+        self.assertEqual(GeoLayer.live.get(name="communes"), self.live)
+        self.assertEqual(self.values_of(self.live), sorted(self.values["nom"]))
+        self.assertEqual(list(self.live.attributes.all()), [self.attribute])
+        self.assertEqual(AttributeValue.objects.get(attribute=self.attribute, content__text="commune 0"), kept)
+        self.assertFalse(GeoLayer.objects.filter(pk=staged.pk).exists())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_new_attribute(self):
+        metadata = {**self.metadata, "attributes": {"nom": "str", "numero": "int"}}
+        values = {**self.values, "numero": [str(i) for i in range(10)]}
+        statistics = {name: profile_values(dict.fromkeys(contents, 1), rows=10) for name, contents in values.items()}
+        rows = write_staged_geolayer(
+            self.source, self.fingerprint, metadata, values, ImportCache(),
+            statistics=statistics, chunk_size=3, writer="bulk",
+        )
+        self.assertEqual(rows, 20)
+        attributes = {attribute.name: attribute for attribute in self.live.attributes.all()}
+        self.assertEqual(attributes["nom"], self.attribute)
+        self.assertEqual(
+            AttributeValue.objects.filter(attribute=attributes["numero"], number__isnull=False).count(), 10
+        )
+        self.assertEqual(AttributeStatistics.objects.filter(attribute__geolayer=self.live).count(), 2)
+        self.assertEqual(GeoLayer.objects.filter(name="communes").count(), 1)
+
+    def test_start_over(self):
+        GeoLayer.objects.create(name="communes", staging=True, geom=self.live.geom, source=self.source)
+        self.assertEqual(self.write(), 10)
+        self.assertEqual(GeoLayer.objects.filter(name="communes").count(), 1)
+        self.assertEqual(self.values_of(GeoLayer.live.get(name="communes")), sorted(self.values["nom"]))
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        geometry = GeometryType.objects.create(name="Point")
+        cls.geolayer = GeoLayer.objects.create(
+            name="layer",
+            geom=geometry,
+            epsg_code=2056,
+            extent=extent_polygon((6.5, 46.4, 6.7, 46.6)),
+        )
+        cls.attribute = Attribute.objects.create(
+            name="commune",
+            geolayer=cls.geolayer,
+            type=AttributeType.objects.create(name="TEXT"),
+        )
+        create_values(cls.attribute, ["Yverdon"])
+        ImportRun.objects.create(command="load_data", started_at=timezone.now())
+
+    def test_geolayer_list(self):
+        response = self.client.get(reverse("iqs:api-geolayer-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"],
+            [{
+                "id": self.geolayer.pk,
+                "name": "layer",
+                "geometry_type": "Point",
+                "epsg_code": 2056,
+                "extent": [6.5, 46.4, 6.7, 46.6],
+            }],
+        )
+
+    def test_geolayer_bbox(self):
+        url = reverse("iqs:api-geolayer-list")
+        response = self.client.get(url, {"bbox": "6.6,46.5,7,47"})
+        self.assertEqual([geolayer["name"] for geolayer in response.json()["results"]], ["layer"])
+        response = self.client.get(url, {"bbox": "7,47,8,48"})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_geolayer_invalid_bbox(self):
+        response = self.client.get(reverse("iqs:api-geolayer-list"), {"bbox": "7,47,8"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("iqs:geolayers"), {"bbox": "8,47,7,48"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_attribute_values(self):
+        response = self.client.get(reverse("iqs:api-attribute-values", args=[self.attribute.pk]))
+        self.assertEqual(response.json()["results"][0]["content"], "Yverdon")
+
+    def test_conditional_get(self):
+        url = reverse("iqs:api-attribute-list")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+        # A new import invalidates the clients' copies
+        ImportRun.objects.create(command="load_data", started_at=timezone.now())
+        response = self.client.get(url, headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_etag_during_import(self):
+        ImportRun.start("load_data")
+        response = self.client.get(reverse("iqs:api-attribute-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+        ImportRun.start("compute_relations").finish()
+        response = self.client.get(reverse("iqs:api-attribute-list"))
+        self.assertFalse(response.has_header("ETag"))
+
+
+class LayerRelationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        geometry = GeometryType.objects.create(name="Polygon")
+        cls.cantons = GeoLayer.objects.create(
+            name="cantons", geom=geometry, extent=extent_polygon((5.9, 45.8, 10.5, 47.8))
+        )
+        cls.communes = GeoLayer.objects.create(
+            name="communes", geom=geometry, extent=extent_polygon((6.5, 46.4, 6.7, 46.6))
+        )
+        GeoLayer.objects.create(name="lakes", geom=geometry, extent=extent_polygon((0, 0, 1, 1)))
+
+    def test_compute_relations(self):
+        call_command("compute_relations", stdout=io.StringIO())
+        relations = LayerRelation.objects.values_list("geolayer__name", "relation__name", "other__name")
+        self.assertCountEqual(relations, [
+            ("cantons", "contains", "communes"),
+            ("communes", "within", "cantons"),
+        ])
+        self.assertFalse(GeoLayer.objects.filter(relations_dirty=True).exists())
+
+    def test_related_layers(self):
+        LayerRelation.objects.create(
+            geolayer=self.cantons,
+            other=self.communes,
+            relation=OgcRelationType.objects.get(name="contains"),
+        )
+        response = self.client.get(reverse("iqs:geolayer_related", args=[self.cantons.pk]))
+        self.assertContains(response, "contains")
+        self.assertContains(response, "communes")
+        response = self.client.get(reverse("iqs:api-geolayer-related", args=[self.cantons.pk]))
+        self.assertEqual(
+            response.json(),
+            [{"relation": "contains", "other": self.communes.pk, "other_name": "communes"}],
+        )
+
+    def test_related_not_found(self):
+        staged = GeoLayer.objects.create(
+            name="cantons", geom=self.cantons.geom, staging=True, extent=self.cantons.extent
+        )
+        for pk in (staged.pk, staged.pk + 1):
+            response = self.client.get(reverse("iqs:api-geolayer-related", args=[pk]))
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(reverse("iqs:geolayer_related", args=[pk]))
+            self.assertEqual(response.status_code, 404)
+
+
+class LoadMetadataTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.enterContext(override_settings(CACHE_DIR=self.directory / "cache"))
+        for filename in ("communes.shp", "lakes.gpkg"):
+            (self.directory / filename).touch()
+        with contextlib.closing(sqlite3.connect(self.directory / "metadata.db")) as db, db:
+            db.execute("CREATE TABLE metadonnees (nom_bdd TEXT, titre TEXT)")
+            db.execute("CREATE TABLE unrelated (id INTEGER)")
+            db.executemany(
+                "INSERT INTO metadonnees VALUES (?, ?)",
+                [("communes.shp", "Communes"), ("rivers.shp", "Rivers")],
+            )
+        source = SourceFile.objects.create(path=str(self.directory / "communes.shp"), size=0, mtime=0)
+        self.geolayer = GeoLayer.objects.create(
+            name="communes", geom=GeometryType.objects.create(name="Polygon"), source=source
+        )
+
+    def test_load_metadata(self):
+        call_command("load_metadata", data_dir=str(self.directory), stdout=io.StringIO())
+        self.geolayer.refresh_from_db()
+        self.assertEqual(self.geolayer.metadata, {"nom_bdd": "communes.shp", "titre": "Communes"})
+        self.assertCountEqual(
+            MetadataMismatch.objects.values_list("kind", "filename"),
+            [(MetadataMismatch.NOT_IN_METADATA, "lakes.gpkg"), (MetadataMismatch.NOT_ON_DISK, "rivers.shp")],
+        )
+        self.assertEqual(ImportRun.last().command, "load_metadata")
+        self.assertIsNotNone(ImportRun.last().finished_at)
+        self.assertFalse((self.directory / "files.csv").exists())
+
+
+class ScanFileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filepath = Path(directory.name) / "multi.gpkg"
+        for layer, geometry, feature_geometry in [
+            ("communes", "Point", {"type": "Point", "coordinates": (2538000, 1152000)}),
+            ("tables", "None", None),
+            ("lakes", "3D Point", {"type": "Point", "coordinates": (2540000, 1150000, 372)}),
+        ]:
+            schema = {"geometry": geometry, "properties": {"name": "str"}}
+            with fiona.open(self.filepath, "w", driver="GPKG", layer=layer, schema=schema, crs="EPSG:2056") as dst:
+                dst.write({"geometry": feature_geometry, "properties": {"name": layer}})
+
+    def test_unique_values(self):
+        gdf = pd.DataFrame({"name": ["a", "b", "a"], "code": [1, 1, 2], "geometry": [None] * 3})
+        gdf.columns = ["name", "name", "geometry"]
+        gdf["kind"] = pd.Categorical(["x", None, "x"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            values = get_unique_values(gdf)
+        self.assertEqual(values, {"name": {"a": 2, "b": 1}, "name_1": {1: 2, 2: 1}, "kind": {None: 1, "x": 2}})
+
+    def test_geometry_type(self):
+        self.assertEqual(fiona_geometry_type("Point Z"), "3D Point")
+        self.assertEqual(fiona_geometry_type("MultiPolygon"), "MultiPolygon")
+
+    def test_scan_every_layer(self):
+        result = scan_file(self.filepath)
+        self.assertEqual(
+            [(layer.metadata["layer_name"], layer.metadata["geometry_type"]) for layer in result.layers],
+            [("communes", "Point"), ("lakes", "3D Point")],
+        )
+        self.assertEqual(result.layers[1].values, {"name": ["lakes"]})
+        self.assertEqual(result.layers[1].metadata["crs"], 2056)
+
+    def test_scan_files_in_pool(self):
+        other = self.filepath.with_name("copy.gpkg")
+        shutil.copy(self.filepath, other)
+        results = sorted(scan_files([self.filepath, other], workers=2), key=lambda result: result.filepath)
+        self.assertEqual([result.filepath for result in results], sorted([self.filepath, other]))
+        expected = scan_file(self.filepath).layers
+        self.assertEqual([result.layers for result in results], [expected, expected])
+
+
+class LoadDataTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.enterContext(override_settings(CACHE_DIR=self.directory / "cache"))
+        schema = {"geometry": "Point", "properties": {"name": "str"}}
+        for filename in ("a.gpkg", "b.gpkg"):
+            with fiona.open(
+                self.directory / filename, "w", driver="GPKG", layer="communes", schema=schema, crs="EPSG:2056"
+            ) as dst:
+                dst.write(
+                    {
+                        "geometry": {"type": "Point", "coordinates": (2538000, 1152000)},
+                        "properties": {"name": filename},
+                    }
+                )
+
+    def load_data(self, **options):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command("load_data", data_dir=str(self.directory), stdout=output, **options)
+        return output.getvalue()
+
+    def layer_values(self):
+        geolayer = GeoLayer.objects.get(name="communes")
+        values = AttributeValue.objects.filter(attribute__geolayer=geolayer, attribute__name="name")
+        return Path(geolayer.source.path).name, list(values.values_list("content__text", flat=True))
+
+    def test_same_layer_name(self):
+        output = self.load_data()
+        self.assertIn("Skipped layer communes of", output)
+        self.assertEqual(self.layer_values(), ("a.gpkg", ["a.gpkg"]))
+        # Not overwritten by the next runs either
+        self.load_data(incremental=True)
+        self.assertEqual(self.layer_values(), ("a.gpkg", ["a.gpkg"]))
+
+        # Imported once the other layer is gone
+        (self.directory / "a.gpkg").unlink()
+        self.load_data(incremental=True)
+        self.assertEqual(self.layer_values(), ("b.gpkg", ["b.gpkg"]))
+
+
+class ImportCacheTests(TestCase):
+    def test_get_or_create(self):
+        AttributeType.objects.create(name="TEXT")
+        cache = ImportCache()
+        # The missing types are created in a single statement
+        with self.assertNumQueries(1):
+            types = cache.get_attribute_types(["TEXT", "INTEGER", "DATE", "INTEGER"])
+        self.assertEqual(list(types), ["TEXT", "INTEGER", "DATE"])
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_attribute_types(["DATE"])["DATE"], types["DATE"])
+        self.assertEqual(AttributeType.objects.count(), 3)
+        self.assertEqual(cache.get_geometry_type("Point"), GeometryType.objects.get(name="Point"))
+
+    def test_geolayers(self):
+        geolayer = GeoLayer.objects.create(name="layer", geom=GeometryType.objects.create(name="Point"))
+        attribute = Attribute.objects.create(
+            name="commune", geolayer=geolayer, type=AttributeType.objects.create(name="TEXT")
+        )
+        cache = ImportCache()
+        self.assertEqual(cache.geolayers, {"layer": geolayer})
+        self.assertEqual(cache.get_attributes(geolayer), {"commune": attribute})
+        cache.forget_geolayer(geolayer)
+        self.assertEqual(cache.geolayers, {})
+        self.assertEqual(cache.get_attributes(geolayer), {})
+
+    def test_value_texts_capped(self):
+        cache = ImportCache()
+        cache.max_value_texts = 2
+        cache.remember_value_texts({"a": 1, "b": 2, "c": 3})
+        self.assertEqual(cache.value_texts, {"a": 1, "b": 2})
+
+
+class InstrumentationTests(TestCase):
+    def test_summary(self):
+        instrumentation = Instrumentation("test")
+        with instrumentation.capture():
+            with instrumentation.stage("read"):
+                list(GeometryType.objects.all())
+                list(AttributeType.objects.all())
+            GeometryType.objects.count()
+        instrumentation.add_rows("read", 10)
+        # Timed in a worker process
+        instrumentation.record("scan", 2.0, rows=100)
+        instrumentation.record_file("/data/a.shp", 1.0)
+        instrumentation.record_file("/data/b.shp", 3.0)
+
+        summary = instrumentation.summary()
+        self.assertEqual(summary["queries"], 3)
+        self.assertEqual(summary["stages"]["read"]["queries"], 2)
+        self.assertEqual(summary["stages"]["read"]["rows"], 10)
+        self.assertEqual(summary["stages"]["other"]["queries"], 1)
+        self.assertEqual(summary["stages"]["scan"]["rows_per_second"], 50)
+        self.assertEqual(list(summary["slowest_files"]), ["/data/b.shp", "/data/a.shp"])
+        self.assertIn('iqs_import_stage_rows{command="test",stage="scan"} 100', instrumentation.prometheus(summary))
+
+    def test_report(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        metrics_json = Path(directory.name) / "metrics.json"
+        prometheus = Path(directory.name) / "metrics.prom"
+        instrumentation = Instrumentation("test")
+        instrumentation.record("scan", 1.0)
+        instrumentation.report(io.StringIO(), metrics_json=metrics_json, prometheus=prometheus)
+        self.assertIn('"command": "test"', metrics_json.read_text())
+        self.assertIn('iqs_import_stage_calls{command="test",stage="scan"} 1', prometheus.read_text())
+
+
+class BenchImportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.report = Path(directory.name) / "report.json"
+
+    def bench(self, **options):
+        call_command(
+            "bench_import",
+            layers=2,
+            features=30,
+            attributes=4,
+            cardinality=5,
+            json=str(self.report),
+            stdout=io.StringIO(),
+            **options,
+        )
+        return json.loads(self.report.read_text())
+
+    def test_rolled_back(self):
+        report = self.bench()
+        # A shapefile and a GeoPackage of 4 attributes with 5 distinct values
+        self.assertEqual(report["stages"]["import"]["rows"], 40)
+        self.assertEqual(report["stages"]["generate"]["rows"], 60)
+        self.assertIn("write", report["load_data"])
+        self.assertEqual(list(report["rss_high_water_mb"]), ["generate", "import"])
+        self.assertFalse(GeoLayer.objects.exists())
+        self.assertFalse(AttributeValue.objects.exists())
+
+    def test_keep(self):
+        self.bench(keep=True, writer="bulk")
+        self.assertEqual(GeoLayer.objects.count(), 2)
+        self.assertEqual(AttributeValue.objects.count(), 40)
+
+    def test_non_empty_database(self):
+        GeoLayer.objects.create(name="layer", geom=GeometryType.objects.create(name="Point"))
+        with self.assertRaises(CommandError):
+            self.bench()
+
+
+class CharsetTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filepath = Path(directory.name) / "communes.shp"
+        self.dbf_filepath = self.filepath.with_suffix(".dbf")
+
+    def test_normalize_encoding(self):
+        self.assertEqual(normalize_encoding("UTF-8"), "utf-8")
+        self.assertEqual(normalize_encoding("1252"), "cp1252")
+        self.assertEqual(normalize_encoding("ANSI 1252"), "cp1252")
+        self.assertEqual(normalize_encoding("ISO 88591\n"), "iso8859-1")
+        self.assertIsNone(normalize_encoding("unknown"))
+
+    def test_probe_utf8(self):
+        write_dbf(self.dbf_filepath, ["Lausanne", "Genève"], "utf-8", language_driver=0x57)
+        self.assertEqual(probe_dbf(self.dbf_filepath), "utf-8")
+
+    def test_probe_ascii_sample(self):
+        # The first megabyte of records is ASCII, the next is not UTF-8
+        write_dbf(self.dbf_filepath, ["Lausanne"] * 30000 + ["Genève"], "cp1252")
+        encoding = probe_dbf(self.dbf_filepath)
+        self.assertNotEqual(encoding, "utf-8")
+        self.assertEqual("Genève".encode("cp1252").decode(encoding), "Genève")
+
+    def test_probe_language_driver(self):
+        write_dbf(self.dbf_filepath, ["Genève", "Zürich"], "cp850", language_driver=0x02)
+        self.assertEqual(probe_dbf(self.dbf_filepath), "cp850")
+        write_dbf(self.dbf_filepath, ["Lausanne"], "ascii", language_driver=0x57)
+        self.assertEqual(probe_dbf(self.dbf_filepath), "cp1252")
+        write_dbf(self.dbf_filepath, ["Lausanne"], "ascii")
+        self.assertEqual(probe_dbf(self.dbf_filepath), "utf-8")
+
+    def test_detect_encoding(self):
+        self.assertEqual(detect_encoding(self.filepath.with_suffix(".gpkg")), "utf-8")
+        self.assertIsNone(detect_encoding(self.filepath))
+        write_dbf(self.dbf_filepath, ["Genève"], "utf-8")
+        self.assertEqual(detect_encoding(self.filepath), "utf-8")
+        # The .cpg sidecar wins
+        self.filepath.with_suffix(".cpg").write_text("ANSI 1252")
+        self.assertEqual(detect_encoding(self.filepath), "cp1252")
+
+    def test_probe_truncated_field(self):
+        # "Genève" cut in the middle of the UTF-8 encoding of "è"
+        write_dbf(self.dbf_filepath, ["Genève", "Zürich"], "utf-8", language_driver=0x57, width=4)
+        self.assertEqual(probe_dbf(self.dbf_filepath), "utf-8")
+        self.assertEqual(check_encoding(self.dbf_filepath, "utf-8"), "utf-8")
+
+    def test_check_encoding(self):
+        write_dbf(self.dbf_filepath, ["Lausanne", "Genève"], "cp1252")
+        self.assertEqual(check_encoding(self.dbf_filepath, "cp1252"), "cp1252")
+        # A wrong encoding is replaced by the next one which decodes
+        with self.assertLogs("iqs.charset", "WARNING"):
+            self.assertEqual(check_encoding(self.dbf_filepath, "utf-8"), "cp1252")
+
+    def test_wrong_cpg(self):
+        write_dbf(self.dbf_filepath, ["Lausanne", "Genève"], "cp1252")
+        self.filepath.with_suffix(".cpg").write_text("UTF-8")
+        with self.assertLogs("iqs.charset", "WARNING") as logs:
+            self.assertEqual(detect_encoding(self.filepath), "cp1252")
+        self.assertIn("declares utf-8 in its .cpg", logs.output[-1])
+
+    def test_encoding_cache(self):
+        write_dbf(self.dbf_filepath, ["Genève"], "cp1252", language_driver=0x57)
+        self.filepath.write_bytes(b"")
+        encoding_cache = EncodingCache(self.filepath.with_name("encodings.json"))
+        self.assertEqual(encoding_cache.get(self.filepath), "cp1252")
+        encoding_cache.save()
+        # Checked once per fingerprint
+        with mock.patch("iqs.charset.detect_encoding") as detect:
+            self.assertEqual(EncodingCache(encoding_cache.path).get(self.filepath), "cp1252")
+        detect.assert_not_called()
+
+
+class FileManifestTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name).resolve()
+        (self.root / "vaud" / ".snapshot").mkdir(parents=True)
+        for filename in ("vaud/communes.shp", "vaud/communes.dbf", "vaud/.snapshot/old.gpkg", "metadata.db", "notes.txt"):
+            (self.root / filename).write_text(filename)
+        cache = tempfile.TemporaryDirectory()
+        self.addCleanup(cache.cleanup)
+        self.path = Path(cache.name) / "manifest.json"
+
+    def test_scan(self):
+        manifest = FileManifest(self.path, self.root)
+        # The .snapshot directory is pruned
+        self.assertEqual(manifest.scan(), 2)
+        self.assertEqual(
+            [(Path(entry.path).name, entry.kind) for entry in manifest.entries()],
+            [("metadata.db", "metadata"), ("communes.dbf", "companion"), ("communes.shp", "data")],
+        )
+        filepath = self.root / "vaud" / "communes.shp"
+        self.assertEqual(manifest.fingerprint(filepath), file_fingerprint(filepath))
+
+    def test_fast_scan(self):
+        manifest = FileManifest(self.path, self.root)
+        manifest.scan()
+        manifest.save()
+
+        (self.root / "vaud" / "lakes.gpkg").write_text("lakes")
+        manifest = FileManifest(self.path, self.root)
+        # Only the directory holding the new file is listed again
+        self.assertEqual(manifest.scan(fast=True), 1)
+        self.assertIn(str(self.root / "vaud" / "lakes.gpkg"), [entry.path for entry in manifest.entries("data")])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        geometry = GeometryType.objects.create(name="Point")
+        geolayer = GeoLayer.objects.create(name="communes", geom=geometry, epsg_code=2056)
+        attribute = Attribute.objects.create(
+            name="nom_commune",
+            geolayer=geolayer,
+            type=AttributeType.objects.create(name="TEXT"),
+        )
+        create_values(attribute, ["Yverdon-les-Bains", "Lausanne", "Genève"])
+
+    def test_search(self):
+        response = self.client.get(reverse("iqs:api-search"), {"q": "yverdon"})
+        hits = response.json()
+        self.assertEqual([value["content"] for value in hits["values"]], ["Yverdon-les-Bains"])
+        self.assertEqual(hits["values"][0]["geolayer_name"], "communes")
+        self.assertEqual(hits["values"][0]["attribute_name"], "nom_commune")
+
+        response = self.client.get(reverse("iqs:api-search"), {"q": "commune"})
+        hits = response.json()
+        self.assertEqual([geolayer["name"] for geolayer in hits["geolayers"]], ["communes"])
+        self.assertEqual([attribute["name"] for attribute in hits["attributes"]], ["nom_commune"])
+
+    def test_short_query(self):
+        response = self.client.get(reverse("iqs:search"), {"q": "ge"})
+        self.assertEqual(list(response.context["values"]), [])
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.attribute = Attribute.objects.create(
+            name="commune",
+            geolayer=GeoLayer.objects.create(name="communes", geom=GeometryType.objects.create(name="Point")),
+            type=AttributeType.objects.create(name="TEXT"),
+        )
+        create_values(cls.attribute, [f"commune {i:03}" for i in range(60)])
+
+    def test_capped_inline(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        response = self.client.get(reverse("admin:iqs_attribute_change", args=[self.attribute.pk]))
+        formsets = {
+            inline_formset.opts.model: inline_formset.formset
+            for inline_formset in response.context["inline_admin_formsets"]
+        }
+        # Only the first max_num of the 60 values, without extra forms
+        self.assertEqual(len(formsets[AttributeValue].forms), 50)
+        self.assertEqual(formsets[AttributeValue].initial_form_count(), 50)
+
+    def test_estimated_count(self):
+        with mock.patch("iqs.pagination.estimated_count", return_value=1_000_000):
+            # Unfiltered: the estimate, without counting the rows
+            with self.assertNumQueries(0):
+                self.assertEqual(EstimatedCountPaginator(AttributeValue.objects.all(), 100).count, 1_000_000)
+            # Filtered: counted
+            queryset = AttributeValue.objects.filter(attribute=self.attribute)
+            self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 60)
+
+    def test_exact_count_under_threshold(self):
+        with mock.patch("iqs.pagination.estimated_count", return_value=500):
+            self.assertEqual(EstimatedCountPaginator(AttributeValue.objects.all(), 100).count, 60)
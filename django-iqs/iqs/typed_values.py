@@ -0,0 +1,66 @@
+import datetime
+import math
+
+from django.utils import timezone
+
+# Typed column of AttributeValue filled for the values of each attribute
+# type (see fiona_to_postgres_type), the other types only have the text
+TYPED_FIELDS = {
+    "INTEGER": "number",
+    "DOUBLE PRECISION": "number",
+    "TIMESTAMP": "timestamp",
+    "DATE": "timestamp",
+    "BOOLEAN": "boolean",
+}
+
+BOOLEANS = {"true": True, "1": True, "false": False, "0": False}
+
+
+def typed_field(type_name):
+    """Return the typed column of the values of an attribute type, or None"""
+    return TYPED_FIELDS.get(type_name)
+
+
+def parse_typed(field, text):
+    """
+    Parse the text of a value into the type of a typed column. Raises
+    ValueError if it is not a value of that type, e.g. "None" or "nan".
+    """
+    if field == "number":
+        number = float(text)
+        if not math.isfinite(number):
+            raise ValueError(f"Not a finite number: {text!r}")
+        return number
+    if field == "timestamp":
+        # Dates are stored as their midnight
+        value = datetime.datetime.fromisoformat(text.strip())
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, datetime.timezone.utc)
+        return value
+    if field == "boolean":
+        try:
+            return BOOLEANS[text.strip().lower()]
+        except KeyError:
+            raise ValueError(f"Not a boolean: {text!r}") from None
+    raise ValueError(f"Unknown typed column {field!r}")
+
+
+def format_typed(value):
+    """Return the text of a typed value, as parse_typed reads it back"""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def typed_values(type_name, text):
+    """
+    Return the typed columns of a value of an attribute type, e.g.
+    {"number": 12.0}, or {} if the type has none or the text does not parse.
+    """
+    field = TYPED_FIELDS.get(type_name)
+    if field is None:
+        return {}
+    try:
+        return {field: parse_typed(field, text)}
+    except ValueError:
+        return {}
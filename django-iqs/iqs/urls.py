@@ -1,13 +1,25 @@
-from django.urls import path
+from django.urls import include, path
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import api, views
 
 app_name = "iqs"
 
+router = DefaultRouter()
+router.register("geolayers", api.GeoLayerViewSet, basename="api-geolayer")
+router.register("attributes", api.AttributeViewSet, basename="api-attribute")
+
 urlpatterns = [
     path("", views.IndexView.as_view(), name="index"),
     path("geolayers/", views.GeolayerView.as_view(), name="geolayers"),
     path("geolayers/<int:pk>/", views.GeolayerDetailView.as_view(), name="geolayer_detail"),
+    path("geolayers/<int:pk>/related/", views.RelatedGeolayerView.as_view(), name="geolayer_related"),
     path('geolayers/<int:pk>/attributes/', views.AttributeView.as_view(), name='attributes'),
     path('geolayers/<int:geolayer_pk>/attributes/<int:attribute_pk>', views.AttributeDetailView.as_view(), name='attribute_detail'),
+    path('geolayers/<int:geolayer_pk>/attributes/<int:attribute_pk>/values/', views.AttributeValueView.as_view(), name='attribute_values'),
+    path("search/", views.SearchView.as_view(), name="search"),
+    path("api/v1/search/", api.SearchView.as_view(), name="api-search"),
+    path("api/v1/", include(router.urls)),
+    path("api/v1/schema/", SpectacularAPIView.as_view(api_version="v1"), name="api-schema"),
 ]
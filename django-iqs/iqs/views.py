@@ -1,12 +1,18 @@
-from django.db.models import F, Q
+from django.core.exceptions import BadRequest
+from django.db.models import F, Prefetch, Q
 from django.forms.models import model_to_dict
 from django.http import HttpResponseRedirect
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import aget_object_or_404, get_object_or_404, render
 from django.urls import reverse
 from django.utils import timezone
 from django.views import generic
 
-from .models import GeoLayer, Attribute
+from .caching import acached, aimport_generation, fragment_timeout
+from .models import GeoLayer, Attribute, AttributeStatistics, LayerRelation
+from .pagination import attribute_values_listing
+from .search import MIN_QUERY_LENGTH, search_catalogue
+from .spatial import filter_bbox, parse_bbox
+from .typed_values import typed_field
 
 
 # Class based views
@@ -15,56 +21,173 @@ class IndexView(generic.ListView):
     template_name = "iqs/index.html"
 
 
-class GeolayerView(generic.ListView):
-    model = GeoLayer 
+class GeolayerView(generic.View):
+    # The catalogue read views are async: served by an ASGI server, a worker
+    # is not held by a request while it waits for the database
     template_name = "iqs/geolayer.html"
-    context_object_name = "geolayers"
 
+    async def get(self, request, *args, **kwargs):
+        queryset = GeoLayer.live.all()
+        key = "geolayers"
+        bbox = request.GET.get("bbox")
+        if bbox:
+            # Layers covering an area (minx,miny,maxx,maxy in WGS 84)
+            try:
+                queryset = filter_bbox(queryset, bbox)
+            except ValueError as err:
+                raise BadRequest(err)
+            # The same area gives the same key, however it is written
+            key = "geolayers:" + ",".join(map(repr, parse_bbox(bbox).extent))
 
-class GeolayerDetailView(generic.DetailView):
-    model = GeoLayer
+        async def geolayers():
+            return [geolayer async for geolayer in queryset]
+
+        # Served from the cache until the next import
+        generation = await aimport_generation()
+        context = {
+            'geolayers': await acached(key, generation, geolayers),
+            'bbox': bbox or "",
+            'generation': generation,
+            'cache_timeout': fragment_timeout(generation),
+        }
+
+        return render(request, self.template_name, context)
+
+
+class GeolayerDetailView(generic.View):
     template_name = "iqs/geolayer_detail.html"
-    context_object_name = "geolayer"
+    # The attributes and their type are fetched in a single extra query
+    queryset = GeoLayer.live.select_related("geom").prefetch_related(
+        Prefetch("attributes", queryset=Attribute.objects.select_related("type").order_by("pk"))
+    )
 
+    async def get(self, request, pk, *args, **kwargs):
+        async def geolayer():
+            return await aget_object_or_404(self.queryset, pk=pk)
 
-class AttributeView(generic.ListView):
-    model = Attribute
-    template_name = "iqs/attribute.html"
-    context_object_name = "attributes"
+        generation = await aimport_generation()
+        context = {
+            'geolayer': await acached(f"geolayer:{pk}", generation, geolayer),
+            'generation': generation,
+            'cache_timeout': fragment_timeout(generation),
+        }
+
+        return render(request, self.template_name, context)
 
-    def get_queryset(self):
-        # Get the layer ID from the URL
-        geolayer_pk = self.kwargs['pk']
-        # Optionally: validate that the layer exists
-        self.geolayer = get_object_or_404(GeoLayer, pk=geolayer_pk)
-        # Return only attributes related to this layer
 
-        return Attribute.objects.filter(geolayer=self.geolayer)
+class RelatedGeolayerView(generic.ListView):
+    model = LayerRelation
+    template_name = "iqs/geolayer_related.html"
+    context_object_name = "relations"
+
+    def get_queryset(self):
+        self.geolayer = get_object_or_404(GeoLayer.live, pk=self.kwargs['pk'])
+        # Relations are precomputed by the compute_relations command
+        return (
+            LayerRelation.objects.filter(geolayer=self.geolayer)
+            .select_related("other", "relation")
+            .order_by("relation__name", "other__name")
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['geolayer'] = self.geolayer  # Pass the geolayer to the template
+        context['geolayer'] = self.geolayer
 
         return context
 
 
-class AttributeDetailView(generic.DetailView):
-    model_ = Attribute
+class AttributeView(generic.View):
+    template_name = "iqs/attribute.html"
+
+    async def get(self, request, pk, *args, **kwargs):
+        async def attributes():
+            # Validate that the layer exists
+            geolayer = await aget_object_or_404(GeoLayer.live, pk=pk)
+            # Only attributes related to this layer
+            queryset = Attribute.objects.filter(geolayer=geolayer).select_related("type")
+            return geolayer, [attribute async for attribute in queryset]
+
+        generation = await aimport_generation()
+        geolayer, attributes = await acached(f"attributes:{pk}", generation, attributes)
+        context = {
+            'geolayer': geolayer,
+            'attributes': attributes,
+            'generation': generation,
+            'cache_timeout': fragment_timeout(generation),
+        }
+
+        return render(request, self.template_name, context)
+
+
+class AttributeDetailView(generic.View):
     template_name = "iqs/attribute_detail.html"
-    context_object_name = "attribute"
-    
+
+    async def get(self, request, geolayer_pk, attribute_pk, *args, **kwargs):
+        attribute = await aget_object_or_404(
+            Attribute.objects.select_related("geolayer", "type", "statistics"),
+            pk=attribute_pk,
+            geolayer__pk=geolayer_pk,
+            geolayer__staging=False,
+        )
+        # Converts the model instance to a dict: {'name': 'X', 'value': 'Y', ...}
+        fields = model_to_dict(attribute)
+        fields['geolayer'] = attribute.geolayer
+        fields['type'] = attribute.type
+        try:
+            statistics = attribute.statistics
+        except AttributeStatistics.DoesNotExist:
+            statistics = None
+        context = {
+            'attribute': attribute,
+            'fields': fields,
+            'statistics': statistics,
+        }
+
+        return render(request, self.template_name, context)
+
+
+class AttributeValueView(generic.TemplateView):
+    template_name = "iqs/attribute_values.html"
+    page_size = 100
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Converts the model instance to a dict: {'name': 'X', 'value': 'Y', ...}
-        context['fields'] = model_to_dict(self.object)
-        context['fields']['geolayer'] = self.object.geolayer
-        context['fields']['type'] = self.object.type
-    
-        return context
-    
-    def get_object(self, queryset=None):
-        return get_object_or_404(
-            Attribute,
+        attribute = get_object_or_404(
+            Attribute.objects.select_related("geolayer", "type"),
             pk=self.kwargs['attribute_pk'],
-            geolayer__pk=self.kwargs['geolayer_pk']
+            geolayer__pk=self.kwargs['geolayer_pk'],
+            geolayer__staging=False,
         )
+        try:
+            values, next_after = attribute_values_listing(attribute, self.request.GET, size=self.page_size)
+        except ValueError as err:
+            raise BadRequest(err)
+        # The query of the next page, with the same filters
+        query = self.request.GET.copy()
+        query.pop("after", None)
+        context.update({
+            "attribute": attribute,
+            "geolayer": attribute.geolayer,
+            "values": values,
+            "prefix": self.request.GET.get("q", ""),
+            "minimum": self.request.GET.get("min", ""),
+            "maximum": self.request.GET.get("max", ""),
+            "typed": typed_field(attribute.type.name) is not None,
+            "query": query.urlencode(),
+            "next_after": next_after,
+        })
+
+        return context
+
+
+class SearchView(generic.TemplateView):
+    template_name = "iqs/search.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get("q", "")
+        context["query"] = query
+        context["min_query_length"] = MIN_QUERY_LENGTH
+        context.update(search_catalogue(query))
+
+        return context